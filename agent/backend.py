@@ -1,16 +1,111 @@
+import time
+import threading
 import streamlit as st
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage
 from langchain.agents import create_agent
+from langchain.agents.middleware import wrap_tool_call, wrap_model_call
 from langchain_community.utilities import SQLDatabase
 from langchain_community.agent_toolkits import SQLDatabaseToolkit
 
 from config import LLM_BASE_URL, LLM_API_KEY, LLM_MODEL
-from agent.tools import docker_python_tool, create_rag_tool
+from agent.tools import create_python_tool, create_python_batch_tool, create_rag_tool
+from agent.execution import get_execution_backend
+from agent.knowledge_base import get_knowledge_base
 from agent.prompts import get_system_prompt
+from tracing import span
 
+# Tools that share state (the Python kernel). Calls to these from the same
+# AI message must still run one after another, in the order the model wrote them.
+STATEFUL_TOOLS = {"docker_python_tool", "docker_python_batch_tool"}
 
-def get_agent_graph(db_uri=None, vector_store=None):
+
+class _StatefulCallGate:
+    """Lets a stateful tool call run only after the earlier ones in its batch finished."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._done = set()  # finished calls of batches that are still running
+
+    def run(self, call_id, batch, fn):
+        predecessors = batch[: batch.index(call_id)] if call_id in batch else []
+        with self._cond:
+            self._cond.wait_for(lambda: all(p in self._done for p in predecessors))
+        try:
+            return fn()
+        finally:
+            with self._cond:
+                if call_id in batch:
+                    self._done.add(call_id)
+                    # Last one of its AI message: nobody waits on these ids any more
+                    if all(c in self._done for c in batch):
+                        self._done.difference_update(batch)
+                self._cond.notify_all()
+
+
+def _stateful_batch(state, call_id):
+    """Ids of the stateful tool calls of the AI message that wrote `call_id`, in order."""
+    messages = state.get("messages", []) if isinstance(state, dict) else []
+    for msg in reversed(messages):
+        calls = getattr(msg, "tool_calls", None)
+        if not calls:
+            continue
+        ids = [c["id"] for c in calls if c["name"] in STATEFUL_TOOLS]
+        return ids if call_id in ids else []
+    return []
+
+
+def _make_tool_middleware():
+    """
+    Wraps every tool call: records its wall time on the ToolMessage and keeps
+    stateful calls ordered. The calls themselves are dispatched concurrently by
+    the agent's tool node (bounded by `max_concurrency`, see TOOL_MAX_WORKERS).
+    """
+    gate = _StatefulCallGate()
+
+    @wrap_tool_call
+    def timed_tool_call(request, handler):
+        call = request.tool_call
+        start = time.perf_counter()
+
+        with span(f"tool.{call['name']}", bytes_in=len(str(call.get("args", "")))) as sp:
+            if call["name"] in STATEFUL_TOOLS:
+                batch = _stateful_batch(request.state, call["id"])
+                result = gate.run(call["id"], batch, lambda: handler(request))
+            else:
+                result = handler(request)
+
+            # Command results (graph jumps) have no metadata to annotate
+            if hasattr(result, "response_metadata"):
+                result.response_metadata["elapsed"] = time.perf_counter() - start
+                result.response_metadata["started_at"] = start
+                sp.set(bytes_out=len(str(result.content)))
+        return result
+
+    return timed_tool_call
+
+
+@wrap_model_call
+def traced_model_call(request, handler):
+    """Records one LLM call with its token usage."""
+    with span("llm.call") as sp:
+        response = handler(request)
+        for msg in getattr(response, "result", None) or []:
+            usage = getattr(msg, "usage_metadata", None)
+            if usage:
+                sp.set(
+                    input_tokens=usage.get("input_tokens", 0),
+                    output_tokens=usage.get("output_tokens", 0),
+                )
+        return response
+
+
+def get_agent_graph(db_uri=None, session_id=None):
+    with span("agent.build", db=bool(db_uri)):
+        return _build_agent_graph(db_uri, session_id)
+
+
+def _build_agent_graph(db_uri, session_id):
     # 1. Setup LLM
     llm = ChatOpenAI(
         base_url=LLM_BASE_URL,
@@ -19,6 +114,9 @@ def get_agent_graph(db_uri=None, vector_store=None):
         temperature=0,
     )
 
+    # Where docker_python_tool runs (Docker sandbox or local kernel)
+    executor = get_execution_backend()
+
     # 2. Database Tools (Dynamic)
     sql_tools = []
     db_status = "INACTIVE"
@@ -27,33 +125,46 @@ def get_agent_graph(db_uri=None, vector_store=None):
     if db_uri:
         try:
             # A. Connect Streamlit to DB (Uses localhost)
-            db = SQLDatabase.from_uri(db_uri)
+            with span("sql.connect"):
+                db = SQLDatabase.from_uri(db_uri)
             sql_toolkit = SQLDatabaseToolkit(db=db, llm=llm)
             sql_tools = sql_toolkit.get_tools()
             db_status = "ACTIVE"
 
             # B. Create the Internal URI for the Agent
             # Replace 'localhost' with 'db' for Docker container networking
-            docker_friendly_uri = db_uri.replace("localhost", "db").replace(
-                "127.0.0.1", "db"
-            )
+            docker_friendly_uri = db_uri
+            if executor.docker_network:
+                docker_friendly_uri = db_uri.replace("localhost", "db").replace(
+                    "127.0.0.1", "db"
+                )
         except Exception as e:
             st.error(f"⚠️ DB Connection Failed in Backend: {e}")
             sql_tools = []
 
     # 3. RAG Tool (Using the Factory)
-    rag_tools = []
-    if vector_store:
-        retriever = vector_store.as_retriever()
-        # Call the factory function to get the tool
-        rag_tools = [create_rag_tool(retriever)]
+    # Always there: it searches the shared knowledge base, which can get
+    # documents after this agent was built
+    rag_tools = [create_rag_tool(get_knowledge_base())]
 
     # 3. Combine Tools
-    all_tools = sql_tools + [docker_python_tool] + rag_tools
+    python_tools = [
+        create_python_tool(session_id),
+        create_python_batch_tool(session_id),
+    ]
+    all_tools = sql_tools + python_tools + rag_tools
 
     # 4. System Prompt
     # 4. Get System Prompt String (Do not wrap in SystemMessage yet)
-    system_prompt_str = get_system_prompt(db_status, docker_friendly_uri)
+    sandbox_workspace = executor.workspace_path(session_id)
+    system_prompt_str = get_system_prompt(
+        db_status, docker_friendly_uri, sandbox_workspace
+    )
 
     # 5. Create Agent (Pass the string directly)
-    return create_agent(llm, all_tools, system_prompt=system_prompt_str)
+    return create_agent(
+        llm,
+        all_tools,
+        system_prompt=system_prompt_str,
+        middleware=[traced_model_call, _make_tool_middleware()],
+    )
@@ -0,0 +1,170 @@
+import os
+import threading
+import requests
+import workspace
+from config import (
+    EXECUTION_BACKEND,
+    DOCKER_EXEC_URL,
+    WORKSPACE_DIR,
+    SANDBOX_WORKSPACE_DIR,
+)
+from tracing import span
+from sandbox import wire
+
+# Where docker_python_tool runs code. Both backends return the same result:
+#   {"logs": str, "error": str | None, "images": [paths relative to the session dir]}
+# "remote" = sandbox/server.py in Docker (isolated), "local" = a jupyter kernel on
+# this machine (trusted single-user setups, no HTTP / JSON).
+
+SANDBOX_HELPERS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sandbox"
+)
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+class ExecutionBackend:
+    name = "base"
+    # True if the code runs inside the docker-compose network (DB host is "db")
+    docker_network = False
+
+    def workspace_path(self, session_id=None):
+        """The session folder as seen by the executed code."""
+        raise NotImplementedError
+
+    def execute(self, code, session_id=None):
+        raise NotImplementedError
+
+    def execute_batch(self, cells, session_id=None, stop_on_error=True, setup=""):
+        """
+        Runs cells in order in one go. Returns {"cells": [...], "images",
+        "seconds", "error"}; each cell is an execute() result plus
+        "status" (ok / error / skipped) and "seconds".
+        """
+        raise NotImplementedError
+
+    def restart(self, session_id=None):
+        raise NotImplementedError
+
+
+class RemoteSandbox(ExecutionBackend):
+    """POSTs code to sandbox/server.py, which reports the images each run wrote."""
+
+    name = "remote"
+    docker_network = True
+
+    def __init__(self, exec_url=DOCKER_EXEC_URL):
+        self.exec_url = exec_url
+        base = exec_url.rsplit("/", 1)[0]
+        self.batch_url = base + "/execute_batch"
+        self.restart_url = base + "/restart"
+
+    def workspace_path(self, session_id=None):
+        return (
+            workspace.sandbox_dir(session_id) if session_id else SANDBOX_WORKSPACE_DIR
+        )
+
+    def execute(self, code, session_id=None):
+        data = self._post(self.exec_url, {"code": code}, session_id, "sandbox.execute")
+        return {
+            "logs": data.get("logs", ""),
+            "error": data.get("error"),
+            # names relative to the session folder (display images + savefig)
+            "images": data.get("images", []),
+        }
+
+    def execute_batch(self, cells, session_id=None, stop_on_error=True, setup=""):
+        payload = {"cells": cells, "stop_on_error": stop_on_error, "setup": setup}
+        return self._post(self.batch_url, payload, session_id, "sandbox.execute_batch")
+
+    def _post(self, url, payload, session_id, span_name):
+        """Sends one request and returns the decoded response."""
+        payload["workspace"] = (
+            workspace.sandbox_relpath(session_id) if session_id else ""
+        )
+
+        with span(span_name, bytes_in=len(str(payload))) as sp:
+            response = requests.post(
+                url,
+                json=payload,
+                # X-Session-Id lets sandbox/router.py keep the session on the
+                # same replica; the rest asks for compressed frames (wire.py)
+                headers={"X-Session-Id": session_id or "", **wire.request_headers()},
+                timeout=300,
+                stream=True,  # <--- 关键：开启流式传输
+            )
+            if response.headers.get("Content-Type", "").startswith(wire.CONTENT_TYPE):
+                data = wire.decode(response.content)
+            else:
+                data = response.json()
+            sp.set(bytes_out=len(response.content), status=response.status_code)
+        return data
+
+    def restart(self, session_id=None):
+        response = requests.post(
+            self.restart_url, headers={"X-Session-Id": session_id or ""}, timeout=30
+        )
+        if response.status_code != 200:
+            raise RuntimeError(response.text)
+        return "Kernel Restarted"
+
+
+class LocalKernel(ExecutionBackend):
+    """Runs code in a jupyter kernel next to the app (see kernel.AgentKernel)."""
+
+    name = "local"
+    docker_network = False
+
+    def __init__(self):
+        from kernel import AgentKernel
+
+        # Same helpers as the Docker sandbox (load_csv, load_sql, ...)
+        preload = (
+            "import sys\n"
+            f"sys.path.insert(0, {SANDBOX_HELPERS_DIR!r})\n"
+            "from datakit import load_csv, load_sql, read_sql_fast, optimize_dtypes, memory_report\n"
+            "from modelkit import train_model, explain_model, feature_importance\n"
+        )
+        self.kernel = AgentKernel(work_dir=WORKSPACE_DIR, preload_code=preload)
+
+    def workspace_path(self, session_id=None):
+        path = workspace.session_dir(session_id) if session_id else WORKSPACE_DIR
+        return os.path.abspath(path)
+
+    def execute(self, code, session_id=None):
+        with span("sandbox.execute", bytes_in=len(code), backend=self.name) as sp:
+            result = self.kernel.execute(code, work_dir=self.workspace_path(session_id))
+            sp.set(bytes_out=len(result["logs"]), images=len(result["images"]))
+        return result
+
+    def execute_batch(self, cells, session_id=None, stop_on_error=True, setup=""):
+        with span("sandbox.execute_batch", cells=len(cells), backend=self.name) as sp:
+            result = self.kernel.execute_batch(
+                cells,
+                work_dir=self.workspace_path(session_id),
+                stop_on_error=stop_on_error,
+                setup=setup,
+            )
+            sp.set(images=len(result["images"]))
+        return result
+
+    def restart(self, session_id=None):
+        return self.kernel.restart()
+
+
+BACKENDS = {"remote": RemoteSandbox, "local": LocalKernel}
+
+
+def get_execution_backend():
+    """The process-wide backend chosen by config.EXECUTION_BACKEND."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if EXECUTION_BACKEND not in BACKENDS:
+                raise ValueError(
+                    f"Unknown EXECUTION_BACKEND {EXECUTION_BACKEND!r}, "
+                    f"expected one of {sorted(BACKENDS)}"
+                )
+            _backend = BACKENDS[EXECUTION_BACKEND]()
+        return _backend
@@ -0,0 +1,152 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from agent.rag import build_vector_store, get_embedding_model
+
+# Process-wide knowledge base behind every session's search_bank_policy tool.
+# Each document gets its own small FAISS index. One writer thread applies the
+# add / remove requests in order and then publishes a new Snapshot; a search
+# uses whatever snapshot is current when it starts, so it never waits for an
+# update or sees half of one, and no agent has to be rebuilt.
+
+DEFAULT_K = 4
+
+_service = None
+_service_lock = threading.Lock()
+
+
+class Snapshot:
+    """One committed version of the knowledge base. Never modified once published."""
+
+    def __init__(self, version, stores, documents):
+        self.version = version
+        self.stores = stores  # document name -> FAISS store
+        self.documents = documents  # document name -> {"path", "chunks", "added_at"}
+
+    def search(self, query, k=DEFAULT_K):
+        if not self.stores:
+            return []
+        vector = get_embedding_model().embed_query(query)
+        hits = []
+        for store in self.stores.values():
+            hits.extend(store.similarity_search_with_score_by_vector(vector, k=k))
+        hits.sort(key=lambda hit: hit[1])  # L2 distance: smaller is closer
+        return [doc for doc, _ in hits[:k]]
+
+
+class KnowledgeBaseService:
+    """
+    add_documents() / remove_document() queue a change and return a Future
+    that resolves once it is searchable: {"version", "added" | "removed", "failed"}.
+    """
+
+    def __init__(self):
+        self._snapshot = Snapshot(0, {}, {})
+        self._queue = queue.Queue()
+        self._writer = None
+        self._lock = threading.Lock()
+
+    # --- readers (any thread, never block) --------------------------------
+    def snapshot(self):
+        return self._snapshot
+
+    @property
+    def version(self):
+        return self._snapshot.version
+
+    def documents(self):
+        return dict(self._snapshot.documents)
+
+    def search(self, query, k=DEFAULT_K):
+        return self._snapshot.search(query, k)
+
+    @property
+    def pending(self):
+        return self._queue.qsize()
+
+    # --- writes (applied by the writer thread) ----------------------------
+    def add_documents(self, paths):
+        """Indexes PDF/TXT files; a file with the same name replaces the old one."""
+        return self._submit("add", list(paths))
+
+    def remove_document(self, name):
+        return self._submit("remove", name)
+
+    def _submit(self, op, arg):
+        future = Future()
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._run, name="kb-writer", daemon=True
+                )
+                self._writer.start()
+        self._queue.put((op, arg, future))
+        return future
+
+    def _run(self):
+        while True:
+            # Everything queued meanwhile goes into the same new version
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._apply(batch)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _apply(self, batch):
+        current = self._snapshot
+        stores = dict(current.stores)
+        documents = dict(current.documents)
+        results = []
+
+        for op, arg, future in batch:
+            if op == "remove":
+                if arg not in stores:
+                    future.set_exception(KeyError(f"Unknown document {arg!r}"))
+                    continue
+                del stores[arg], documents[arg]
+                results.append((future, {"removed": [arg], "failed": {}}))
+                continue
+
+            added, failed = [], {}
+            for path in arg:
+                name = os.path.basename(path)
+                try:
+                    store = build_vector_store([path])
+                except Exception as e:
+                    failed[name] = str(e)
+                    continue
+                if store is None:
+                    failed[name] = "no text could be read"
+                    continue
+                stores[name] = store
+                documents[name] = {
+                    "path": path,
+                    "chunks": store.index.ntotal,
+                    "added_at": time.time(),
+                }
+                added.append(name)
+            results.append((future, {"added": added, "failed": failed}))
+
+        if results:
+            self._snapshot = Snapshot(current.version + 1, stores, documents)
+        for future, result in results:
+            result["version"] = self._snapshot.version
+            future.set_result(result)
+
+
+def get_knowledge_base():
+    """The process-wide service (shared by all sessions)."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = KnowledgeBaseService()
+        return _service
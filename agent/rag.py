@@ -1,21 +1,29 @@
 import os
-from langchain_community.document_loaders import PyPDFLoader, TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
+import threading
 
-# 初始化模型
-embedding_model = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-MiniLM-L6-v2"
-)
+# sentence-transformers (torch) 很重：第一次用到知识库时才加载，之后复用
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+_embedding_model = None
+_embedding_lock = threading.Lock()
 
 
-def build_vector_store(file_paths):
+def get_embedding_model():
+    global _embedding_model
+    with _embedding_lock:
+        if _embedding_model is None:
+            from langchain_community.embeddings import HuggingFaceEmbeddings
+
+            # 初始化模型
+            _embedding_model = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+        return _embedding_model
+
+
+def split_documents(file_paths):
     """
-    读取 PDF/TXT 文件并构建 FAISS 向量库
+    读取 PDF/TXT 文件并切分成 chunk (读不了的文件跳过)
     """
-    if not file_paths:
-        return None
+    from langchain_community.document_loaders import PyPDFLoader, TextLoader
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
 
     all_docs = []
 
@@ -34,12 +42,26 @@ def build_vector_store(file_paths):
             continue  # 跳过这个出错的文件，继续处理下一个
 
     if not all_docs:
-        return None
+        return []
 
     # 切分文本
     text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    splits = text_splitter.split_documents(all_docs)
+    return text_splitter.split_documents(all_docs)
+
+
+def build_vector_store(file_paths):
+    """
+    读取 PDF/TXT 文件并构建 FAISS 向量库
+    """
+    if not file_paths:
+        return None
+
+    splits = split_documents(file_paths)
+    if not splits:
+        return None
+
+    from langchain_community.vectorstores import FAISS
 
     # 构建向量库
-    vector_store = FAISS.from_documents(splits, embedding_model)
+    vector_store = FAISS.from_documents(splits, get_embedding_model())
     return vector_store
@@ -1,13 +1,15 @@
 import os
 import re
 import uuid
-import time
-import requests
 import traceback
+from typing import List
 from langchain_core.tools import tool
 from pydantic import BaseModel, Field
-from config import WORKSPACE_DIR, DOCKER_EXEC_URL
+import workspace
+from config import WORKSPACE_DIR
 from utils import strip_ansi_codes
+from tracing import span
+from agent.execution import get_execution_backend
 
 
 class PythonToolInput(BaseModel):
@@ -16,118 +18,208 @@ class PythonToolInput(BaseModel):
     )
 
 
-@tool("docker_python_tool", args_schema=PythonToolInput)
-def docker_python_tool(code: str) -> str:
-    """
-    Executes Python code in Docker.
-    Uses Robust Set Difference to detect new images (ignores timestamps).
-    """
-    # 1. Clean the code
+def _clean_code(code):
     cleaned_code = re.sub(r"^```[a-zA-Z]*\n", "", code.strip())
-    cleaned_code = re.sub(r"\n```$", "", cleaned_code)
+    return re.sub(r"\n```$", "", cleaned_code)
 
-    # 2. GENERATE MARKER
-    exec_id = uuid.uuid4().hex
-    marker_print = f"print('__EXECUTION_START_{exec_id}__')"
 
-    # 3. SETUP CODE
-    setup_code = (
+def _setup_code(code_dir):
+    return (
         "import matplotlib\n"
         "matplotlib.use('Agg')\n"
         "import matplotlib.pyplot as plt\n"
         "import pandas as pd\n"
         "import os\n"
         "import sys\n"
-        "os.chdir('/app/workspace')\n"
-    )
-    final_code = (
-        setup_code
-        + "\n"
-        + marker_print
-        + "\n"
-        + cleaned_code
-        + "\n"
-        + "sys.stdout.flush()"
+        f"os.chdir({code_dir!r})\n"
     )
 
-    try:
-        files_before = set(os.listdir(WORKSPACE_DIR))
-    except Exception:
-        files_before = set()
-
-    try:
-        response = requests.post(
-            DOCKER_EXEC_URL,
-            json={"code": final_code},
-            timeout=300,
-            stream=True,  # <--- 关键：开启流式传输
+
+# --- PYTHON TOOL FACTORY (one per session workspace) ---
+def create_python_tool(session_id=None):
+    """
+    Creates the Python tool bound to a session workspace. Without a session
+    it uses the shared workspace root (old behaviour). The code runs on the
+    backend chosen in config.EXECUTION_BACKEND (see agent/execution.py).
+    """
+    backend = get_execution_backend()
+    host_dir = workspace.session_dir(session_id) if session_id else WORKSPACE_DIR
+    code_dir = backend.workspace_path(session_id)
+
+    @tool("docker_python_tool", args_schema=PythonToolInput)
+    def docker_python_tool(code: str) -> str:
+        """
+        Executes Python code in Docker.
+        Uses Robust Set Difference to detect new images (ignores timestamps).
+        """
+        if session_id:
+            workspace.touch(session_id)
+
+        # 1. Clean the code
+        cleaned_code = _clean_code(code)
+
+        # 2. GENERATE MARKER
+        exec_id = uuid.uuid4().hex
+        marker_print = f"print('__EXECUTION_START_{exec_id}__')"
+
+        # 3. SETUP CODE
+        final_code = (
+            _setup_code(code_dir)
+            + "\n"
+            + marker_print
+            + "\n"
+            + cleaned_code
+            + "\n"
+            + "sys.stdout.flush()"
         )
-        data = response.json()
 
-        # --- LOG PARSING ---
-        raw_logs = strip_ansi_codes(data.get("logs", ""))
-        marker_str = f"__EXECUTION_START_{exec_id}__"
+        try:
+            data = backend.execute(final_code, session_id)
+
+            # --- LOG PARSING ---
+            raw_logs = data.get("logs", "")  # ANSI codes already stripped
+            marker_str = f"__EXECUTION_START_{exec_id}__"
+
+            if marker_str in raw_logs:
+                logs = raw_logs.split(marker_str)[1].lstrip()
+            else:
+                logs = raw_logs
+
+            if "error" in data and data["error"]:
+                return f"EXECUTION_ERROR:\n{data['error']}"
+
+            # Keep the session under its byte quota (oldest artifacts go first)
+            if session_id:
+                workspace.enforce_quota(session_id)
+            valid_images = [
+                f
+                for f in data.get("images", [])
+                if os.path.exists(os.path.join(host_dir, f))
+            ]
+
+            output = logs
+            if valid_images:
+                img_str = ", ".join(valid_images)
+                output += f"\n[IMAGE_GENERATED:{img_str}]"
+            elif not logs.strip() and not valid_images:
+                return "Success (Code Executed, No Text Output)"
+
+            return output if output.strip() else "Success (No Output)"
 
-        if marker_str in raw_logs:
-            logs = raw_logs.split(marker_str)[1].lstrip()
-        else:
-            logs = raw_logs
+        except Exception:
+            raw_trace = traceback.format_exc()
+            clean_trace = strip_ansi_codes(raw_trace)
+            return f"EXECUTION_ERROR:\n{clean_trace}"
 
-        if "error" in data and data["error"]:
-            clean_err = strip_ansi_codes(data["error"])
-            return f"EXECUTION_ERROR:\n{clean_err}"
+    return docker_python_tool
 
-        time.sleep(1)
 
-        try:
-            files_after = set(os.listdir(WORKSPACE_DIR))
-        except Exception:
-            files_after = set()
+class PythonBatchToolInput(BaseModel):
+    cells: List[str] = Field(
+        description="Python cells to run in order (e.g. load, clean, aggregate, plot). Each MUST be valid python."
+    )
+    stop_on_error: bool = Field(
+        default=True, description="Skip the remaining cells after a cell fails."
+    )
 
-        new_files = files_after - files_before
-        valid_images = [
-            f
-            for f in new_files
-            if f.lower().endswith((".png", ".jpg", ".jpeg", ".svg"))
-        ]
 
-        output = logs
-        if valid_images:
-            img_str = ", ".join(valid_images)
-            output += f"\n[IMAGE_GENERATED:{img_str}]"
-        elif not logs.strip() and not valid_images:
-            return "Success (Code Executed, No Text Output)"
+# --- PYTHON BATCH TOOL FACTORY: several dependent cells, one round trip ---
+def create_python_batch_tool(session_id=None):
+    """
+    Same kernel and workspace as docker_python_tool, but runs a list of cells
+    in one request. The output has one section per cell with its timing.
+    """
+    backend = get_execution_backend()
+    host_dir = workspace.session_dir(session_id) if session_id else WORKSPACE_DIR
+    code_dir = backend.workspace_path(session_id)
 
-        return output if output.strip() else "Success (No Output)"
+    @tool("docker_python_batch_tool", args_schema=PythonBatchToolInput)
+    def docker_python_batch_tool(cells: List[str], stop_on_error: bool = True) -> str:
+        """
+        Executes several Python cells in order in one go (shared variables).
+        Use it for a chain of small dependent steps instead of many separate calls.
+        """
+        if session_id:
+            workspace.touch(session_id)
 
-    except Exception:
-        raw_trace = traceback.format_exc()
-        clean_trace = strip_ansi_codes(raw_trace)
-        return f"EXECUTION_ERROR:\n{clean_trace}"
+        try:
+            data = backend.execute_batch(
+                [_clean_code(c) + "\nsys.stdout.flush()" for c in cells],
+                session_id,
+                stop_on_error=stop_on_error,
+                setup=_setup_code(code_dir),
+            )
+        except Exception:
+            clean_trace = strip_ansi_codes(traceback.format_exc())
+            return f"EXECUTION_ERROR:\n{clean_trace}"
+
+        if data.get("error"):
+            return f"EXECUTION_ERROR:\n{data['error']}"
+
+        if session_id:
+            workspace.enforce_quota(session_id)
+
+        sections = []
+        for i, cell in enumerate(data.get("cells", []), start=1):
+            status = cell.get("status", "ok")
+            if status == "skipped":
+                sections.append(f"### Cell {i}: skipped (an earlier cell failed)")
+                continue
+            logs = cell.get("logs", "").strip()
+            head = f"### Cell {i} ({status}, {cell.get('seconds', 0):.2f}s)"
+            if cell.get("error"):
+                body = f"EXECUTION_ERROR:\n{cell['error']}"
+            elif status == "error":
+                body = f"EXECUTION_ERROR:\n{logs}"
+            else:
+                body = logs or "Success (No Output)"
+            images = [
+                f
+                for f in cell.get("images", [])
+                if os.path.exists(os.path.join(host_dir, f))
+            ]
+            if images:
+                body += f"\n[IMAGE_GENERATED:{', '.join(images)}]"
+            sections.append(f"{head}\n{body}")
+        return "\n\n".join(sections) if sections else "Success (No Cells)"
+
+    return docker_python_batch_tool
 
 
 # --- NEW: RAG TOOL FACTORY ---
-def create_rag_tool(retriever):
+def create_rag_tool(knowledge_base):
     """
-    Creates a search tool bound to a specific document retriever.
-    We wrap it in a function so we can pass the 'retriever' object dynamically.
+    Creates a search tool bound to the shared knowledge base service.
+    Every call searches its latest snapshot, so documents added or removed
+    later are picked up without building a new agent.
     """
-    
+
     @tool
     def search_bank_policy(query: str) -> str:
         """
-        Searches the Bank Policy & Data Dictionary. 
+        Searches the Bank Policy & Data Dictionary.
         Use this when the user asks about definitions, rules, churn policy, or domain knowledge.
         """
         try:
-            # The tool uses the 'retriever' from the outer scope
-            docs = retriever.invoke(query)
+            snapshot = knowledge_base.snapshot()
+            if not snapshot.documents:
+                return "The knowledge base is empty (no policy documents uploaded yet)."
+            with span(
+                "rag.search", bytes_in=len(query), version=snapshot.version
+            ) as sp:
+                docs = snapshot.search(query)
+                sp.set(docs=len(docs), bytes_out=sum(len(d.page_content) for d in docs))
             if not docs:
                 return "No relevant documents found."
-            
+
             # Format the results nicely
-            return "\n\n".join([f"[Source: {doc.metadata.get('source', 'Unknown')}]\n{doc.page_content}" for doc in docs])
+            return "\n\n".join(
+                [
+                    f"[Source: {doc.metadata.get('source', 'Unknown')}]\n{doc.page_content}"
+                    for doc in docs
+                ]
+            )
         except Exception as e:
             return f"Error searching documents: {str(e)}"
 
-    return search_bank_policy
\ No newline at end of file
+    return search_bank_policy
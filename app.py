@@ -1,22 +1,48 @@
 import streamlit as st
 import pandas as pd
 import os
-import time
 import re
+import json
+import time
 import uuid
 import streamlit.components.v1 as components
-from ydata_profiling import ProfileReport
-from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
-import requests  # <--- ADD THIS LINE
-from config import WORKSPACE_DIR
+from concurrent.futures import ThreadPoolExecutor
+import workspace
+from config import TOOL_MAX_WORKERS, HISTORY_WINDOW, WORKSPACE_QUOTA_BYTES
 from utils import (
     render_images_in_grid,
     get_llm_friendly_summary,
+    summarize_data_file,
     save_uploaded_file,
-    extract_image_from_response,
+    ensure_parsed,
 )
-from agent.backend import get_agent_graph
-from agent.rag import build_vector_store  # <--- NEW IMPORT
+from agent.execution import get_execution_backend
+from agent.knowledge_base import get_knowledge_base
+from ingest import copy_csv_to_postgres, table_name_for
+from profile_engine import should_stream
+from profiling import submit_profile, get_profile_job, file_sha256, STAGES
+from tool_batches import ToolBatches
+from tracing import span, start_turn, set_enabled as set_tracing
+from tracing import is_enabled as is_tracing_enabled
+
+# langchain / embeddings / sqlalchemy are imported on first use, not at startup,
+# so the page shows up before they load (benchmarks/startup.py keeps it that way)
+
+
+def get_agent_graph(*args, **kwargs):
+    from agent.backend import get_agent_graph as _get_agent_graph
+
+    return _get_agent_graph(*args, **kwargs)
+
+
+def current_agent():
+    """The session's agent, built the first time a message or upload needs it."""
+    if st.session_state.agent_graph is None:
+        st.session_state.agent_graph = get_agent_graph(
+            st.session_state.db_uri,
+            session_id=st.session_state.session_id,
+        )
+    return st.session_state.agent_graph
 
 
 def render_sidebar_guide():
@@ -63,14 +89,325 @@ def render_sidebar_guide():
         st.error("🔄 **Restart:** Use if the Agent gets stuck.")
 
 
-# --- Helper Function to Save Files ---
-def save_uploaded_file(uploaded_file, folder="workspace"):
-    if not os.path.exists(folder):
-        os.makedirs(folder)
-    file_path = os.path.join(folder, uploaded_file.name)
-    with open(file_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
-    return file_path, uploaded_file.name
+# --- Tool Call Rendering & History ---
+def describe_tool_call(tool_name, tool_args):
+    """Returns (label, language, display text) for any tool call."""
+    if tool_name == "docker_python_tool":
+        return "📝 Executed Python Code", "python", tool_args.get("code", "")
+    if tool_name == "docker_python_batch_tool":
+        cells = tool_args.get("cells", [])
+        text = "\n\n".join(
+            f"# --- Cell {i} ---\n{c}" for i, c in enumerate(cells, start=1)
+        )
+        return f"📝 Executed {len(cells)} Python Cells", "python", text
+    if tool_name == "sql_db_query":
+        return "📝 Executed SQL Query", "sql", tool_args.get("query", "")
+    return f"🔧 Called `{tool_name}`", "json", json.dumps(tool_args, indent=2)
+
+
+def tool_call_to_history(tool_call, batch_id):
+    """Converts a LangChain tool call into a chat history entry."""
+    tool_name = tool_call["name"]
+    tool_args = tool_call.get("args", {})
+    _, lang, text = describe_tool_call(tool_name, tool_args)
+    return {
+        "role": "assistant",
+        "type": "code",
+        "language": lang,
+        "content": text,
+        "tool_id": tool_call.get("id") or f"call_{uuid.uuid4().hex[:8]}",
+        "tool_name": tool_name,
+        "args": tool_args,
+        "batch_id": batch_id,  # calls from the same AI message share this
+    }
+
+
+def _history_tool_name(msg):
+    # Old history entries only stored the language
+    if msg.get("tool_name"):
+        return msg["tool_name"]
+    return "sql_db_query" if msg.get("language") == "sql" else "docker_python_tool"
+
+
+def render_tool_call(msg, expanded=False):
+    tool_name = _history_tool_name(msg)
+    label, _, _ = describe_tool_call(tool_name, msg.get("args", {}))
+    with st.expander(label, expanded=expanded):
+        st.code(msg["content"], language=msg.get("language", "python"))
+
+
+def render_tool_output(msg, live=False, key=None):
+    ensure_parsed(msg, current_workspace())
+    output = msg["content"]
+    tool_name = msg.get("tool_name") or ""
+
+    if tool_name == "docker_python_batch_tool":
+        render_batch_cells(msg, live=live, key=key)
+
+    elif live and "EXECUTION_ERROR:" in output:
+        st.error("🚨 Code Execution Failed")
+        with st.expander("🔍 Traceback", expanded=True):
+            st.code(output.replace("EXECUTION_ERROR:\n", ""))
+
+    # 1. RAG OUTPUT (Hide Text)
+    elif "search_bank_policy" in tool_name:
+        with st.status("📚 Checked Knowledge Base", state="complete"):
+            st.info("✅ Retrieved relevant information from Bank Policy.")
+            with st.expander("View Source Text"):
+                st.text(output)
+
+    # 2. PYTHON / SQL OUTPUT (Show Charts)
+    else:
+        with st.expander("📊 Result Output", expanded=live):
+            if msg["clean"].strip():
+                st.text(msg["clean"])
+            render_images_in_grid(msg["images"], key=key)
+
+    if msg.get("elapsed") is not None:
+        st.caption(f"⏱️ `{tool_name}` took {msg['elapsed']:.2f}s")
+
+
+BATCH_CELL_RE = re.compile(r"^### Cell (\d+)(.*)$", re.MULTILINE)
+
+
+def render_batch_cells(msg, live=False, key=None):
+    """One block per cell of a docker_python_batch_tool result."""
+    parts = BATCH_CELL_RE.split(msg["clean"])
+    # split() gives [before, n, header, body, n, header, body, ...]
+    cells = [parts[i : i + 3] for i in range(1, len(parts) - 2, 3)]
+    failed = any("EXECUTION_ERROR:" in body for _, _, body in cells)
+    with st.expander(f"📊 Result Output ({len(cells)} cells)", expanded=live or failed):
+        for number, header, body in cells:
+            body = body.strip()
+            st.caption(f"Cell {number}{header}")
+            if "EXECUTION_ERROR:" in body:
+                st.error(f"🚨 Cell {number} failed")
+                st.code(body.replace("EXECUTION_ERROR:\n", ""))
+            elif body:
+                st.text(body)
+        render_images_in_grid(msg["images"], key=key)
+
+
+def render_batch_timing(metas):
+    """Shows wall time vs. summed time for a batch of concurrent tool calls."""
+    timed = [m for m in metas if "elapsed" in m and "started_at" in m]
+    if len(timed) < 2:
+        return
+    wall = max(m["started_at"] + m["elapsed"] for m in timed) - min(
+        m["started_at"] for m in timed
+    )
+    total = sum(m["elapsed"] for m in timed)
+    st.caption(
+        f"⚡ Ran {len(timed)} tools concurrently in {wall:.2f}s "
+        f"(sequential would be ~{total:.2f}s)"
+    )
+
+
+def show_tool_outputs(chat, outputs):
+    """Renders streamed tool results [(history entry, metadata)] and records them."""
+    for entry, _ in outputs:
+        with span("ui.render"):
+            render_tool_output(entry, live=True, key=len(chat["messages"]))
+        chat["messages"].append(entry)
+
+
+def build_lc_messages(history):
+    """Rebuilds the LangChain message list from the chat history."""
+    from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
+
+    lc_msgs = []
+    last_tool_id = None
+    last_batch_id = None
+
+    for i, m in enumerate(history):
+        if m["role"] == "user":
+            lc_msgs.append(HumanMessage(content=m["content"]))
+            last_batch_id = None
+        elif m["type"] == "text":
+            lc_msgs.append(AIMessage(content=m["content"]))
+            last_batch_id = None
+        elif m["type"] == "code":
+            tool_name = _history_tool_name(m)
+            args = m.get("args")
+            if args is None:
+                key = "query" if tool_name == "sql_db_query" else "code"
+                args = {key: m["content"]}
+            t_id = m.get("tool_id", f"call_{i}")
+            last_tool_id = t_id
+            call = {"name": tool_name, "args": args, "id": t_id}
+
+            # Calls from one AI message go back as one message with many tool_calls
+            batch_id = m.get("batch_id")
+            if batch_id and batch_id == last_batch_id:
+                lc_msgs[-1].tool_calls.append(call)
+            else:
+                lc_msgs.append(AIMessage(content="", tool_calls=[call]))
+            last_batch_id = batch_id
+        elif m["type"] == "output":
+            t_id = m.get("tool_id") or last_tool_id
+            if t_id:
+                lc_msgs.append(ToolMessage(tool_call_id=t_id, content=m["content"]))
+            last_batch_id = None
+
+    return lc_msgs
+
+
+# --- Token Streaming ---
+def _chunk_text(content):
+    # Some providers send content as a list of parts instead of a string
+    if isinstance(content, str):
+        return content
+    return "".join(
+        p.get("text", "") if isinstance(p, dict) else str(p) for p in content or []
+    )
+
+
+class LiveModelStep:
+    """
+    Streams one model step into two placeholders (thought text and tool-call
+    arguments). Only these placeholders are updated per token, the rest of the
+    chat is left alone.
+    """
+
+    REDRAW_INTERVAL = 0.05  # seconds between placeholder redraws
+
+    def __init__(self):
+        self.text_slot = st.empty()
+        self.args_slot = st.empty()
+        self.text = ""
+        self.calls = {}  # tool_call_chunk index -> {"name", "args"}
+        self._last_draw = 0.0
+
+    def feed(self, chunk):
+        """Adds one AIMessageChunk. Returns True if it carried any tokens."""
+        piece = _chunk_text(chunk.content)
+        self.text += piece
+        for tc in chunk.tool_call_chunks or []:
+            call = self.calls.setdefault(tc.get("index") or 0, {"name": "", "args": ""})
+            call["name"] += tc.get("name") or ""
+            call["args"] += tc.get("args") or ""
+
+        got_tokens = bool(piece) or bool(chunk.tool_call_chunks)
+        if got_tokens and time.perf_counter() - self._last_draw > self.REDRAW_INTERVAL:
+            self._draw()
+        return got_tokens
+
+    def _draw(self):
+        self._last_draw = time.perf_counter()
+        if self.text.strip():
+            self.text_slot.markdown(f"💭 **Thought:** {self.text}▌")
+        if self.calls:
+            preview = "\n".join(
+                f"{c['name'] or '...'}({c['args']})" for c in self.calls.values()
+            )
+            self.args_slot.code(preview, language="json")
+
+    def finish(self, final_text):
+        if final_text and final_text.strip():
+            self.text_slot.markdown(f"💭 **Thought:** {_chunk_text(final_text)}")
+        else:
+            self.text_slot.empty()
+        self.args_slot.empty()
+
+
+# --- Latency Breakdown ---
+def render_latency_breakdown(stats, expanded=False):
+    """Per-component timings of one turn, from the tracing spans."""
+    rows = stats.get("breakdown")
+    if not rows:
+        return
+    with st.expander("⏱️ Latency breakdown", expanded=expanded):
+        ttft = stats.get("ttft")
+        st.caption(
+            f"Turn: {stats['total']:.2f}s · first token: "
+            + (f"{ttft:.2f}s" if ttft is not None else "n/a")
+        )
+        st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+
+
+# --- Background Jobs (Profiling & Agent Priming) ---
+@st.cache_resource
+def background_pool():
+    """Process-wide thread pool for work that must not block the UI."""
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="bg")
+
+
+def prime_agent(agent_graph, file_path, file_name, docker_path, df=None, job=None):
+    """Summarises the upload (streaming for big files) and primes the agent."""
+    from langchain_core.messages import HumanMessage
+
+    data_summary = (
+        get_llm_friendly_summary(df)
+        if df is not None
+        else summarize_data_file(file_path, profile_job=job)
+    )
+    init_prompt = (
+        f"SYSTEM EVENT: User uploaded '{file_name}'. "
+        f"1. Auto-load it: `df = load_csv('{docker_path}')`. "
+        f"2. DATA SUMMARY:\n{data_summary}\n\n"
+        f"Acknowledge readiness."
+    )
+    return agent_graph.invoke({"messages": [HumanMessage(content=init_prompt)]})
+
+
+def render_background_status(chat):
+    """Progress of the profiling job / priming call. True while one is still running."""
+    job = get_profile_job(chat["profile_hash"]) or submit_profile(
+        chat["file_path"], chat["profile_hash"]
+    )
+    priming = chat.get("priming")
+
+    if job.status == "running":
+        c1, c2 = st.columns([4, 1])
+        c1.progress(
+            job.progress,
+            text=f"📊 Profiling: {STAGES[job.stage]}... ({job.elapsed:.0f}s)",
+        )
+        if c2.button("✖ Cancel", key=f"cancel_{chat['profile_hash']}"):
+            job.cancel()
+            st.rerun(scope="app")
+    elif job.status == "cancelled":
+        st.warning("Profiling cancelled.")
+        if st.button("↻ Retry profiling"):
+            submit_profile(chat["file_path"], chat["profile_hash"])
+            st.rerun(scope="app")
+    elif job.status == "failed":
+        st.error("Profiling failed. You can still chat with the data.")
+    elif not chat.get("report_shown"):
+        # Report just finished: rerun once so Step 2 picks it up
+        chat["report_shown"] = True
+        st.rerun(scope="app")
+
+    if priming is not None:
+        if not priming.done():
+            st.caption("🧠 Priming agent in the background...")
+        else:
+            chat["priming"] = None
+            if priming.exception():
+                st.caption(f"⚠️ Agent priming failed: {priming.exception()}")
+
+    return job.status == "running" or chat.get("priming") is not None
+
+
+@st.fragment(run_every=1)
+def poll_background_status(chat):
+    """Re-renders the status every second without rerunning the whole page."""
+    if not render_background_status(chat):
+        # Cancelled / failed and nothing left to wait for: the page shows the
+        # final state without this fragment, so the polling stops
+        st.rerun(scope="app")
+
+
+# --- Session Workspace ---
+@st.cache_resource
+def start_workspace_gc():
+    """One background GC per process for workspaces of expired sessions."""
+    return workspace.start_gc()
+
+
+def current_workspace():
+    """Host folder of this browser session's workspace."""
+    return workspace.session_dir(st.session_state.session_id)
 
 
 # --- CONFIGURATION ---
@@ -79,9 +416,15 @@ st.set_page_config(page_title="Agentic Data Scientist", page_icon="🤖", layout
 if "db_uri" not in st.session_state:
     st.session_state.db_uri = None
 
-# Initialize Agent
+# Every browser session gets its own workspace folder
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex[:12]
+workspace.touch(st.session_state.session_id)
+start_workspace_gc()
+
+# Agent is built lazily by current_agent()
 if "agent_graph" not in st.session_state:
-    st.session_state.agent_graph = get_agent_graph(st.session_state.db_uri)
+    st.session_state.agent_graph = None
 
 # --- SESSION STATE ---
 if "chats" not in st.session_state:
@@ -95,8 +438,8 @@ if "chats" not in st.session_state:
     }
     st.session_state.current_chat_id = "default"
 
-if "vector_store" not in st.session_state:
-    st.session_state.vector_store = None
+if "kb_uploaded" not in st.session_state:
+    st.session_state.kb_uploaded = set()  # uploader file_ids already sent to the KB
 
 # ==========================================
 # SIDEBAR
@@ -117,7 +460,10 @@ with st.sidebar:
         if st.button("🔗 Connect DB", use_container_width=True):
             new_uri = f"postgresql://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}"
             try:
-                new_agent = get_agent_graph(new_uri)
+                new_agent = get_agent_graph(
+                    new_uri,
+                    session_id=st.session_state.session_id,
+                )
                 st.session_state.agent_graph = new_agent
                 st.session_state.db_uri = new_uri
                 st.success("Connected!")
@@ -133,43 +479,67 @@ with st.sidebar:
 
     st.divider()
 
+    with st.expander("⏱️ Tracing & Latency", expanded=False):
+        trace_on = st.toggle("Record traces", value=is_tracing_enabled())
+        if trace_on != is_tracing_enabled():
+            set_tracing(trace_on)
+        st.caption("Spans are appended to `traces/spans.jsonl`.")
+
+        traced_turns = [
+            t for t in st.session_state.chats[st.session_state.current_chat_id].get(
+                "turn_stats", []
+            )
+            if t.get("breakdown")
+        ]
+        if traced_turns:
+            idx = st.selectbox(
+                "Turn",
+                range(len(traced_turns)),
+                index=len(traced_turns) - 1,
+                format_func=lambda i: f"{i + 1}. {traced_turns[i]['prompt'][:40]}",
+            )
+            render_latency_breakdown(traced_turns[idx], expanded=True)
+
+    st.divider()
+
     with st.expander("🧹 Workspace Management", expanded=False):
+        st.caption(
+            f"Session workspace: {workspace.usage(st.session_state.session_id) / 1e6:.1f} MB "
+            f"of {WORKSPACE_QUOTA_BYTES / 1e6:.0f} MB"
+        )
         if st.button("🗑️ Clear Workspace", use_container_width=True):
-            for f in os.listdir(WORKSPACE_DIR):
-                file_path = os.path.join(WORKSPACE_DIR, f)
-                try:
-                    if os.path.isfile(file_path):
-                        os.unlink(file_path)
-                except Exception as e:
-                    st.error(f"Error deleting {f}: {e}")
-            st.success("Workspace cleared!")
+            try:
+                workspace.clear(st.session_state.session_id)
+                st.success("Workspace cleared!")
+            except Exception as e:
+                st.error(f"Error clearing workspace: {e}")
             time.sleep(1)
             st.rerun()
 
         # --- Restart Kernel Button ---
         if st.button("🔄 Restart Python Kernel", use_container_width=True):
             try:
-                # Send request to Docker
-                response = requests.post("http://localhost:5000/restart", timeout=5)
-
-                if response.status_code == 200:
-                    st.toast("✅ Kernel Restarted Successfully!", icon="🔄")
-                    # Optional: Add a system message to chat history
-                    st.session_state.chats[st.session_state.current_chat_id][
-                        "messages"
-                    ].append(
-                        {
-                            "role": "assistant",
-                            "type": "text",
-                            "content": "🔄 **System Notification:** Python Kernel has been restarted. Memory cleared.",
-                        }
-                    )
-                    time.sleep(1)
-                    st.rerun()
-                else:
-                    st.error(f"Failed to restart: {response.text}")
+                # Docker sandbox or local kernel, whichever runs the Python tool
+                get_execution_backend().restart(st.session_state.session_id)
+                restarted = True
             except Exception as e:
-                st.error(f"Connection Error: {e}")
+                restarted = False
+                st.error(f"Failed to restart: {e}")
+
+            if restarted:
+                st.toast("✅ Kernel Restarted Successfully!", icon="🔄")
+                # Optional: Add a system message to chat history
+                st.session_state.chats[st.session_state.current_chat_id][
+                    "messages"
+                ].append(
+                    {
+                        "role": "assistant",
+                        "type": "text",
+                        "content": "🔄 **System Notification:** Python Kernel has been restarted. Memory cleared.",
+                    }
+                )
+                time.sleep(1)
+                st.rerun()
 
 # ==========================================
 # MAIN INTERFACE
@@ -194,47 +564,91 @@ with st.expander("📁 Step 1: Upload Data & Knowledge", expanded=True):
         )
 
         if uploaded_file and not st.session_state.get("db_active", False):
-            # --- CHANGE HERE: Save to 'workspace' ---
-            file_path, file_name = save_uploaded_file(uploaded_file, folder="workspace")
-            df = pd.read_csv(file_path)
-            current_chat["df"] = df
+            # --- Save to this session's workspace (pinned: never evicted) ---
+            file_path, file_name = save_uploaded_file(
+                uploaded_file, folder=current_workspace()
+            )
+            workspace.pin(st.session_state.session_id, file_name)
+            # Files above PROFILE_STREAMING_THRESHOLD are never loaded whole here
+            current_chat["df"] = None if should_stream(file_path) else pd.read_csv(file_path)
             current_chat["file_name"] = file_name
+            current_chat["file_path"] = file_path
+
+            # 1. Profile report: background process, cached by content hash
+            content_hash = file_sha256(file_path)
+            with span("profile.submit") as sp:
+                job = submit_profile(file_path, content_hash)
+                sp.set(cache_hit=job.cache_hit)
+            current_chat["profile_hash"] = content_hash
+            current_chat["report_html_path"] = job.report_path
+
+            # 2. Prime the agent in the background, chat is usable right away
+            # The path the executed code sees (container or host, per backend)
+            exec_dir = get_execution_backend().workspace_path(st.session_state.session_id)
+            docker_path = f"{exec_dir}/{file_name}"
+            current_chat["priming"] = background_pool().submit(
+                prime_agent,
+                current_agent(),
+                file_path,
+                file_name,
+                docker_path,
+                current_chat["df"],
+                job,
+            )
+
+            current_chat["messages"].append(
+                {
+                    "role": "assistant",
+                    "type": "text",
+                    "content": f"✅ **Data Loaded!** Ready to analyze **{file_name}**.",
+                }
+            )
+            st.session_state["db_active"] = True
+            st.rerun()
 
-            with st.status("🚀 Processing Data...", expanded=True) as status:
-                if len(df) > 5000:
-                    profile_df = df.sample(n=5000, random_state=42)
-                else:
-                    profile_df = df
-
-                pr = ProfileReport(profile_df, explorative=False, minimal=True)
-                report_path = os.path.join(WORKSPACE_DIR, f"report_{current_id}.html")
-                pr.to_file(report_path)
-                current_chat["report_html_path"] = report_path
-
-                st.write("Priming Agent...")
-                data_summary = get_llm_friendly_summary(df)
-                docker_path = f"/app/workspace/{file_name}"
-
-                init_prompt = (
-                    f"SYSTEM EVENT: User uploaded '{file_name}'. "
-                    f"1. Auto-load it: `df = pd.read_csv('{docker_path}')`. "
-                    f"2. DATA SUMMARY:\n{data_summary}\n\n"
-                    f"Acknowledge readiness."
-                )
-                st.session_state.agent_graph.invoke(
-                    {"messages": [HumanMessage(content=init_prompt)]}
-                )
+        # --- Bulk-load the uploaded CSV into Postgres (visible to the SQL tools) ---
+        if current_chat.get("file_path") and st.session_state.db_uri:
+            table = table_name_for(current_chat["file_name"])
+            if current_chat.get("ingested_table") == table:
+                st.caption(f"🗄️ Available in Postgres as `{table}`")
+            elif st.button(f"🗄️ Load into Postgres as `{table}`", use_container_width=True):
+                bar = st.progress(0.0, text="Streaming CSV with COPY...")
+                last = [0.0]
+
+                def _on_progress(frac):
+                    # Redraw at most every 1% to keep COPY the bottleneck
+                    if frac - last[0] >= 0.01 or frac >= 1.0:
+                        last[0] = frac
+                        bar.progress(frac, text=f"Streaming CSV with COPY... {frac:.0%}")
 
-                current_chat["messages"].append(
-                    {
-                        "role": "assistant",
-                        "type": "text",
-                        "content": f"✅ **Data Loaded!** Ready to analyze **{file_name}**.",
-                    }
-                )
-                status.update(label="Data Ready!", state="complete", expanded=False)
-                st.session_state["db_active"] = True
-            st.rerun()
+                try:
+                    stats = copy_csv_to_postgres(
+                        current_chat["file_path"],
+                        st.session_state.db_uri,
+                        table_name=table,
+                        progress=_on_progress,
+                    )
+                    # SQLDatabase reflects tables when created -> rebuild the agent
+                    st.session_state.agent_graph = get_agent_graph(
+                        db_uri=st.session_state.db_uri,
+                        session_id=st.session_state.session_id,
+                    )
+                    current_chat["ingested_table"] = table
+                    current_chat["messages"].append(
+                        {
+                            "role": "assistant",
+                            "type": "text",
+                            "content": (
+                                f"🗄️ **Loaded {stats['rows']:,} rows** into table "
+                                f"`{table}` in {stats['seconds']:.1f}s "
+                                f"({stats['rows_per_sec']:,.0f} rows/s). "
+                                f"Indexed: {', '.join(stats['indexes']) or 'none'}."
+                            ),
+                        }
+                    )
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Ingestion failed: {e}")
 
     # === COLUMN 2: KNOWLEDGE BASE (For RAG) ===
     with c2:
@@ -246,29 +660,60 @@ with st.expander("📁 Step 1: Upload Data & Knowledge", expanded=True):
             key="rag_uploader",
         )
 
-        # Check if files are uploaded AND vector store is empty
-        if kb_files and st.session_state.vector_store is None:
-            with st.spinner("Processing Knowledge Base..."):
+        # New uploads go into the shared knowledge base: every chat (and every
+        # agent already built) searches the new version, nothing is rebuilt
+        kb = get_knowledge_base()
+        seen = st.session_state.kb_uploaded
+        new_files = [f for f in kb_files or [] if f.file_id not in seen]
+        if new_files:
+            with st.spinner(f"Indexing {len(new_files)} document(s)..."):
                 kb_paths = []
-                for f in kb_files:
+                for f in new_files:
                     # --- CHANGE HERE: Save to 'knowledge_base' folder ---
                     path, _ = save_uploaded_file(f, folder="knowledge_base")
                     kb_paths.append(path)
+                    seen.add(f.file_id)
+                result = kb.add_documents(kb_paths).result()
 
-                # 1. Build the Vector Store (Reads from knowledge_base/)
-                st.session_state.vector_store = build_vector_store(kb_paths)
-
-                # 2. Re-Initialize Agent with the NEW Brain
-                st.session_state.agent_graph = get_agent_graph(
-                    db_uri=st.session_state.get("db_uri"),
-                    vector_store=st.session_state.vector_store,
-                )
-
+            if result["added"]:
                 st.success(
-                    f"✅ Ingested {len(kb_files)} documents from 'knowledge_base/'!"
+                    f"✅ Ingested {len(result['added'])} documents from 'knowledge_base/'! "
+                    f"(version {result['version']})"
                 )
+            for name, error in result["failed"].items():
+                st.error(f"⚠️ Could not index {name}: {error}")
+
+        kb_docs = kb.documents()
+        if kb_docs:
+            st.caption(
+                f"📚 Knowledge base v{kb.version}: {len(kb_docs)} document(s), shared by all chats"
+            )
+            for name, info in sorted(kb_docs.items()):
+                doc_col, remove_col = st.columns([5, 1])
+                doc_col.markdown(f"📄 `{name}` ({info['chunks']} chunks)")
+                if remove_col.button("🗑️", key=f"kb_remove_{name}", help="Remove"):
+                    try:
+                        kb.remove_document(name).result()
+                    except KeyError:
+                        # already removed (e.g. from another chat or a double click)
+                        st.warning(f"⚠️ {name} is no longer in the knowledge base.")
+                    else:
+                        st.rerun()
 
 # --- STEP 2: REPORT ---
+if current_chat.get("profile_hash") and (
+    not current_chat.get("report_shown") or current_chat.get("priming")
+):
+    job = get_profile_job(current_chat["profile_hash"])
+    if (
+        job is not None
+        and job.status in ("cancelled", "failed")
+        and not current_chat.get("priming")
+    ):
+        render_background_status(current_chat)
+    else:
+        poll_background_status(current_chat)
+
 if current_chat["report_html_path"] and os.path.exists(
     current_chat["report_html_path"]
 ):
@@ -281,44 +726,32 @@ st.divider()
 # --- STEP 3: CHAT RENDER ---
 st.subheader("💬 Step 3: Chat with your Data")
 
-for msg in current_chat["messages"]:
+# Only the newest HISTORY_WINDOW messages are drawn; older ones on request
+history = current_chat["messages"]
+window = current_chat.setdefault("history_window", HISTORY_WINDOW)
+first = max(0, len(history) - window)
+if first > 0:
+    if st.button(f"⬆️ Show older messages ({first} hidden)"):
+        current_chat["history_window"] = window + HISTORY_WINDOW
+        st.rerun()
+
+for idx in range(first, len(history)):
+    msg = history[idx]
     if msg.get("type") == "code":
-        lang = msg.get("language", "python")
-        label = (
-            "📝 Executed Python Code" if lang == "python" else "📝 Executed SQL Query"
-        )
         with st.chat_message("assistant"):
-            with st.expander(label, expanded=False):
-                st.code(msg["content"], language=lang)
+            render_tool_call(msg, expanded=False)
 
     elif msg.get("type") == "output":
         with st.chat_message("assistant"):
-            # Check if this output came from the RAG Tool (Bank Policy)
-            # We assume we saved 'tool_name' in the history (see Part 2 below)
-            if "search_bank_policy" in msg.get("tool_name", ""):
-                with st.status("📚 Checked Knowledge Base", state="complete"):
-                    st.info("✅ Retrieved relevant information from Bank Policy.")
-                    with st.expander("View Source Text"):
-                        st.text(msg["content"])
-
-            # Otherwise, assume it's Python/Data Output (Show Charts)
-            else:
-                with st.expander("📊 Result Output", expanded=False):
-                    images = extract_image_from_response(msg["content"])
-                    clean_out = re.sub(r"\[IMAGE_GENERATED:.*?\]", "", msg["content"])
-                    if clean_out.strip():
-                        st.text(clean_out)
-                    render_images_in_grid(images)
+            render_tool_output(msg, live=False, key=idx)
 
     else:
         if msg["content"] and msg["content"].strip():
             with st.chat_message(msg["role"]):
-                images = extract_image_from_response(msg["content"])
-                clean_text = re.sub(r"\[IMAGE_GENERATED:.*?\]", "", msg["content"])
-                st.markdown(clean_text)
-                render_images_in_grid(images)
+                ensure_parsed(msg, current_workspace())
+                st.markdown(msg["clean"])
+                render_images_in_grid(msg["images"], key=idx)
 
-# --- STEP 4: INPUT & LOGIC ---
 # --- STEP 4: INPUT & LOGIC ---
 if prompt := st.chat_input("Ask about correlations, trends..."):
     # 1. Append User Message
@@ -327,58 +760,61 @@ if prompt := st.chat_input("Ask about correlations, trends..."):
         st.markdown(prompt)
 
     with st.chat_message("assistant"):
-        # 2. Prepare LangChain Messages
-        lc_msgs = []
-        last_tool_id = None
-
-        for i, m in enumerate(current_chat["messages"][:-1]):
-            if m["role"] == "user":
-                lc_msgs.append(HumanMessage(content=m["content"]))
-            elif m["role"] == "assistant":
-                if m["type"] == "text":
-                    lc_msgs.append(AIMessage(content=m["content"]))
-                elif m["type"] == "code":
-                    t_id = m.get("tool_id", f"call_{i}")
-                    last_tool_id = t_id
-                    lc_msgs.append(
-                        AIMessage(
-                            content="",
-                            tool_calls=[
-                                {
-                                    "name": "docker_python_tool",
-                                    "args": {"code": m["content"]},
-                                    "id": t_id,
-                                }
-                            ],
-                        )
-                    )
-                elif m["type"] == "output":
-                    if last_tool_id:
-                        lc_msgs.append(
-                            ToolMessage(tool_call_id=last_tool_id, content=m["content"])
-                        )
+        from langchain_core.messages import (
+            HumanMessage,
+            AIMessage,
+            AIMessageChunk,
+            ToolMessage,
+        )
 
+        # 2. Prepare LangChain Messages
+        lc_msgs = build_lc_messages(current_chat["messages"][:-1])
         lc_msgs.append(HumanMessage(content=prompt))
 
-        # 3. Stream Agent
-        try:
-            active_tool_id = None
-            last_tool_name = None  # <--- NEW: Track which tool is running
+        # 3. Stream Agent (one trace turn; spans from tool threads join it)
+        with start_turn(prompt) as turn, span("turn") as turn_span:
+            try:
+                call_names = {}  # tool_call_id -> tool name, for every call in this turn
+                batches = ToolBatches()  # results come one update per call
+                turn_start = time.perf_counter()
+                ttft = None
+                live_step = None  # placeholders of the model step being streamed
+
+                for mode, event in current_agent().stream(
+                    {"messages": lc_msgs},
+                    config={"max_concurrency": TOOL_MAX_WORKERS},
+                    stream_mode=["messages", "updates"],
+                ):
+                    # --- 0. TOKENS (only from the agent's own model node) ---
+                    if mode == "messages":
+                        token, meta = event
+                        if meta.get("langgraph_node") != "model" or not isinstance(
+                            token, AIMessageChunk
+                        ):
+                            continue
+                        if live_step is None:
+                            live_step = LiveModelStep()
+                        if live_step.feed(token) and ttft is None:
+                            ttft = time.perf_counter() - turn_start
+                        continue
+
+                    for node_name, values in event.items():
+                        if "messages" not in values:
+                            continue
 
-            for event in st.session_state.agent_graph.stream({"messages": lc_msgs}):
-                for node_name, values in event.items():
-                    if "messages" in values:
                         for msg in values["messages"]:
 
                             # --- A. AI DECISION (Thoughts & Tool Calls) ---
                             if isinstance(msg, AIMessage):
                                 # Display Thoughts
-                                if msg.content and (
+                                is_new_thought = bool(msg.content) and (
                                     not current_chat["messages"]
                                     or current_chat["messages"][-1]["content"]
                                     != msg.content
-                                ):
-                                    st.markdown(f"💭 **Thought:** {msg.content}")
+                                )
+                                if is_new_thought:
+                                    if live_step is None:
+                                        st.markdown(f"💭 **Thought:** {msg.content}")
                                     current_chat["messages"].append(
                                         {
                                             "role": "assistant",
@@ -387,103 +823,61 @@ if prompt := st.chat_input("Ask about correlations, trends..."):
                                         }
                                     )
 
-                                # Handle Tool Calls
-                                if msg.tool_calls:
-                                    tool_call = msg.tool_calls[0]
-                                    tool_name = tool_call["name"]
-                                    tool_args = tool_call["args"]
-                                    last_tool_name = tool_name  # <--- Capture the name!
+                                # The streamed text stays; the raw argument preview
+                                # is replaced by the proper tool call rendering below
+                                if live_step is not None:
+                                    live_step.finish(msg.content if is_new_thought else "")
+                                    live_step = None
 
-                                    active_tool_id = tool_call.get(
-                                        "id", f"call_{uuid.uuid4().hex[:8]}"
-                                    )
-
-                                    # Display Logic based on Tool Type
-                                    if tool_name == "docker_python_tool":
-                                        code = tool_args.get("code", "")
-                                        with st.expander(
-                                            "📝 Executed Python Code", expanded=True
-                                        ):
-                                            st.code(code, language="python")
-
-                                        # Save Code to History
-                                        current_chat["messages"].append(
-                                            {
-                                                "role": "assistant",
-                                                "type": "code",
-                                                "language": "python",
-                                                "content": code,
-                                                "tool_id": active_tool_id,
-                                            }
-                                        )
-
-                                    elif tool_name == "sql_db_query":
-                                        query = tool_args.get("query", "")
-                                        with st.expander(
-                                            "📝 Executed SQL Query", expanded=True
-                                        ):
-                                            st.code(query, language="sql")
-
-                                        # Save SQL to History
-                                        current_chat["messages"].append(
-                                            {
-                                                "role": "assistant",
-                                                "type": "code",
-                                                "language": "sql",
-                                                "content": query,
-                                                "tool_id": active_tool_id,
-                                            }
-                                        )
+                                # Handle ALL Tool Calls (they run concurrently)
+                                batch_id = msg.id or f"batch_{uuid.uuid4().hex[:8]}"
+                                batches.start(
+                                    batch_id, [c["id"] for c in msg.tool_calls]
+                                )
+                                for tool_call in msg.tool_calls:
+                                    entry = tool_call_to_history(tool_call, batch_id)
+                                    call_names[entry["tool_id"]] = entry["tool_name"]
+                                    render_tool_call(entry, expanded=True)
+                                    current_chat["messages"].append(entry)
 
                             # --- B. TOOL OUTPUT (Results) ---
                             elif isinstance(msg, ToolMessage):
-                                output = msg.content
-
-                                if "EXECUTION_ERROR:" in output:
-                                    st.error("🚨 Code Execution Failed")
-                                    with st.expander("🔍 Traceback", expanded=True):
-                                        st.code(
-                                            output.replace("EXECUTION_ERROR:\n", "")
-                                        )
-                                else:
-                                    # 1. RAG OUTPUT (Hide Text)
-                                    if (
-                                        last_tool_name
-                                        and "search_bank_policy" in last_tool_name
-                                    ):
-                                        with st.status(
-                                            "📚 Checking Knowledge Base...",
-                                            state="complete",
-                                        ):
-                                            st.info(
-                                                "✅ Found relevant info in Bank Policy."
-                                            )
-                                            with st.expander("View Source Details"):
-                                                st.text(output)
-
-                                    # 2. PYTHON OUTPUT (Show Charts)
-                                    else:
-                                        with st.expander(
-                                            "📊 Result Output", expanded=True
-                                        ):
-                                            clean = re.sub(
-                                                r"\[IMAGE_GENERATED:.*?\]", "", output
-                                            )
-                                            if clean.strip():
-                                                st.text(clean)
-                                            render_images_in_grid(
-                                                extract_image_from_response(output)
-                                            )
-
-                                # Save Output to History (WITH TOOL NAME)
-                                current_chat["messages"].append(
-                                    {
-                                        "role": "assistant",
-                                        "type": "output",
-                                        "content": output,
-                                        "tool_name": last_tool_name,  # <--- Important for history rendering
-                                    }
+                                meta = msg.response_metadata or {}
+                                entry = {
+                                    "role": "assistant",
+                                    "type": "output",
+                                    "content": msg.content,
+                                    "tool_id": msg.tool_call_id,
+                                    "tool_name": call_names.get(
+                                        msg.tool_call_id, msg.name or ""
+                                    ),
+                                    "elapsed": meta.get("elapsed"),
+                                }
+                                # Shown in the order the calls were written
+                                ready, finished = batches.add(
+                                    msg.tool_call_id, (entry, meta)
                                 )
+                                show_tool_outputs(current_chat, ready)
+                                if finished and len(finished) > 1:
+                                    render_batch_timing([m for _, m in finished])
+
+                # Calls that never returned must not hide the results after them
+                show_tool_outputs(current_chat, batches.drain())
+
+                # Time-to-first-token for every turn
+                total = time.perf_counter() - turn_start
+                current_chat.setdefault("turn_stats", []).append(
+                    {"prompt": prompt, "ttft": ttft, "total": total, "turn_id": turn.turn_id}
+                )
+                ttft_str = f"{ttft:.2f}s" if ttft is not None else "n/a"
+                st.caption(f"⚡ First token in {ttft_str} · turn took {total:.2f}s")
+                turn_span.set(ttft_ms=round(ttft * 1000, 1) if ttft is not None else None)
+
+            except Exception as e:
+                st.error(f"An error occurred: {e}")
 
-        except Exception as e:
-            st.error(f"An error occurred: {e}")
+        # 4. Latency breakdown for this turn (only when tracing is on)
+        stats = current_chat.get("turn_stats") or [{}]
+        if is_tracing_enabled() and stats[-1].get("turn_id") == turn.turn_id:
+            stats[-1]["breakdown"] = turn.breakdown()
+            render_latency_breakdown(stats[-1])
@@ -0,0 +1,345 @@
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import tracemalloc
+import subprocess
+import requests
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+# End-to-end load test, fully offline:
+#   stub LLM (benchmarks/stub_llm.py) -> get_agent_graph -> tools
+#   -> the real sandbox/server.py (local kernel, no Docker) + a local database.
+# Run from the repo root:  python -m benchmarks.load_test --analysts 8 --turns 5
+#
+# The database is a SQLite copy of the sample CSV by default, so SQL timings are
+# not the app's Postgres path; pass --db-uri postgresql://... to measure that
+# (the sample is loaded into table "churn" with COPY, as the app does).
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from benchmarks.stub_llm import StubLLMServer, load_script  # noqa: E402
+
+SAMPLE_CSV = os.path.join(REPO_DIR, "test_file", "Churn_Modelling.csv")
+PROMPT = "Give me an overview of the churn data and plot the balance distribution."
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _rss_mb(pid=None):
+    """Resident memory of a process in MB (None if it can't be read)."""
+    pid = pid or os.getpid()
+    try:
+        import psutil
+
+        return psutil.Process(pid).memory_info().rss / 1e6
+    except ImportError:
+        pass
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1e3
+    except OSError:
+        pass
+    return None
+
+
+def build_sqlite(folder):
+    """Loads the sample CSV into a SQLite file (table 'churn')."""
+    import pandas as pd
+    from sqlalchemy import create_engine
+
+    path = os.path.join(folder, "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    pd.read_csv(SAMPLE_CSV).to_sql("churn", engine, index=False, if_exists="replace")
+    engine.dispose()
+    return f"sqlite:///{path}"
+
+
+def load_postgres(db_uri):
+    """Loads the sample CSV into Postgres (table 'churn') the way the app does."""
+    from ingest import copy_csv_to_postgres
+
+    copy_csv_to_postgres(SAMPLE_CSV, db_uri, table_name="churn")
+    return db_uri
+
+
+class RssSampler:
+    """Samples this process's RSS in the background (peak while the turns run)."""
+
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = _rss_mb()
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def start_sandbox(work_dir, port, timeout=60):
+    """Starts sandbox/server.py as a local process and waits until it executes code."""
+    env = dict(os.environ, SANDBOX_WORKDIR=work_dir, SANDBOX_PORT=str(port))
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(REPO_DIR, "sandbox", "server.py")],
+        cwd=work_dir,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}/execute"
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Sandbox exited with code {proc.returncode}")
+        try:
+            requests.post(url, json={"code": "1"}, timeout=5).raise_for_status()
+            return proc
+        except requests.RequestException:
+            time.sleep(0.5)
+    proc.kill()
+    raise RuntimeError("Sandbox did not become ready in time")
+
+
+def percentiles(values):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": round(p50, 1), "p95": round(p95, 1), "p99": round(p99, 1)}
+
+
+def run_analyst(graph, session_id, turns, prompt, max_concurrency):
+    """One simulated analyst: `turns` chat turns on its own growing history."""
+    from tracing import span, start_turn
+
+    history, results = [], []
+    for i in range(turns):
+        history.append({"role": "user", "content": prompt})
+        start = time.perf_counter()
+        error = None
+        with start_turn(f"{session_id}#{i}") as turn, span("turn"):
+            try:
+                state = graph.invoke(
+                    {"messages": history},
+                    config={"max_concurrency": max_concurrency},
+                )
+                history = state["messages"]
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+        results.append(
+            {
+                "session": session_id,
+                "seconds": time.perf_counter() - start,
+                "error": error,
+                "breakdown": turn.breakdown(),
+            }
+        )
+    return results
+
+
+def summarize(results, wall_seconds, memory):
+    ok = [r for r in results if not r["error"]]
+    components = {}
+    for r in ok:
+        for row in r["breakdown"]:
+            components.setdefault(row["component"], []).append(row["total_ms"])
+    return {
+        "turns": len(results),
+        "errors": len(results) - len(ok),
+        "wall_seconds": round(wall_seconds, 2),
+        "turns_per_sec": round(len(ok) / wall_seconds, 3) if wall_seconds else None,
+        "turn_ms": percentiles([r["seconds"] * 1000 for r in ok]),
+        # per turn: summed time of that component's spans within the turn
+        "components": {
+            name: dict(percentiles(values), turns=len(values))
+            for name, values in sorted(
+                components.items(), key=lambda kv: -float(np.median(kv[1]))
+            )
+        },
+        "memory": memory,
+        "first_errors": [r["error"] for r in results if r["error"]][:5],
+    }
+
+
+def print_report(report):
+    print(
+        f"\n📊 {report['turns']} turns ({report['errors']} errors) in "
+        f"{report['wall_seconds']}s -> {report['turns_per_sec']} turns/s"
+    )
+    t = report["turn_ms"]
+    print(f"   turn latency ms: p50 {t['p50']}  p95 {t['p95']}  p99 {t['p99']}\n")
+    print(f"   {'component':<32}{'turns':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, row in report["components"].items():
+        print(
+            f"   {name:<32}{row['turns']:>7}{row['p50']:>10}{row['p95']:>10}{row['p99']:>10}"
+        )
+    mem = report["memory"]
+    print(
+        f"\n   per session: {mem['rss_mb_per_session']} MB agent RSS after its turns, "
+        f"{mem['graph_build_kb']} KB heap to build its graph, "
+        f"{mem['workspace_kb_per_session']} KB workspace"
+    )
+    print(
+        f"   RSS agent {mem['agent_rss_mb']} MB (peak {mem['agent_rss_peak_mb']} MB, "
+        f"+{mem['agent_rss_delta_mb']} MB), sandbox {mem['sandbox_rss_mb']} MB"
+    )
+    for err in report["first_errors"]:
+        print(f"   ⚠️ {err}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end load test")
+    parser.add_argument("--analysts", type=int, default=4)
+    parser.add_argument("--turns", type=int, default=3, help="turns per analyst")
+    parser.add_argument(
+        "--db-uri",
+        default=None,
+        help="postgresql://... to test the app's SQL path (default: SQLite copy)",
+    )
+    parser.add_argument("--llm-latency-ms", type=float, default=0)
+    parser.add_argument("--script", default=None, help="stub LLM script (JSON)")
+    parser.add_argument("--prompt", default=PROMPT)
+    parser.add_argument("--json", default=None, help="also write the report here")
+    parser.add_argument("--keep", action="store_true", help="keep the temp folder")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="agent-bench-")
+    work_dir = os.path.join(root, "workspace")
+    os.makedirs(work_dir)
+
+    stub = StubLLMServer(
+        script=load_script(args.script) if args.script else None,
+        latency_ms=args.llm_latency_ms,
+    ).start()
+    sandbox_port = _free_port()
+
+    # config.py reads these at import, so set them before importing the agent
+    os.environ.update(
+        LLM_BASE_URL=stub.base_url,
+        DOCKER_EXEC_URL=f"http://127.0.0.1:{sandbox_port}/execute",
+        WORKSPACE_DIR=work_dir,
+        SANDBOX_WORKSPACE_DIR=work_dir,
+        TRACE_ENABLED="1",
+        TRACE_FILE=os.path.join(root, "spans.jsonl"),
+    )
+
+    sandbox = None
+    try:
+        print("🚀 Starting local sandbox...")
+        sandbox = start_sandbox(work_dir, sandbox_port)
+        if args.db_uri and args.db_uri.startswith("postgres"):
+            db_uri = load_postgres(args.db_uri)
+        else:
+            db_uri = args.db_uri or build_sqlite(root)
+
+        from config import TOOL_MAX_WORKERS
+        from agent.backend import get_agent_graph
+        import tracing
+        import workspace
+
+        tracing.set_enabled(True)
+        rss_before = _rss_mb()
+
+        # Graphs are built one at a time so their heap cost can be attributed
+        sessions = [f"bench{i:03d}" for i in range(args.analysts)]
+        graphs, graph_bytes = {}, []
+        tracemalloc.start()
+        for sid in sessions:
+            before = tracemalloc.get_traced_memory()[0]
+            graphs[sid] = get_agent_graph(db_uri, session_id=sid)
+            graph_bytes.append(tracemalloc.get_traced_memory()[0] - before)
+        tracemalloc.stop()
+
+        print(f"🏃 {args.analysts} analysts x {args.turns} turns...")
+        start = time.perf_counter()
+        with RssSampler() as sampler, ThreadPoolExecutor(
+            max_workers=args.analysts
+        ) as pool:
+            futures = [
+                pool.submit(
+                    run_analyst,
+                    graphs[sid],
+                    sid,
+                    args.turns,
+                    args.prompt,
+                    TOOL_MAX_WORKERS,
+                )
+                for sid in sessions
+            ]
+            results = [r for f in futures for r in f.result()]
+        wall = time.perf_counter() - start
+
+        rss_after = _rss_mb()
+        sandbox_rss = _rss_mb(sandbox.pid)
+        rss_delta = rss_after - rss_before if rss_after and rss_before else None
+        memory = {
+            # what a session still holds after its turns (graph, history, caches)
+            "rss_mb_per_session": (
+                round(rss_delta / args.analysts, 2) if rss_delta is not None else None
+            ),
+            # Python heap allocated while building one graph (before any turn)
+            "graph_build_kb": round(np.mean(graph_bytes) / 1e3, 1),
+            "workspace_kb_per_session": round(
+                np.mean([workspace.usage(sid) for sid in sessions]) / 1e3, 1
+            ),
+            "agent_rss_mb": round(rss_after, 1) if rss_after else None,
+            "agent_rss_peak_mb": round(sampler.peak, 1) if sampler.peak else None,
+            "agent_rss_delta_mb": (
+                round(rss_delta, 1) if rss_delta is not None else None
+            ),
+            "sandbox_rss_mb": round(sandbox_rss, 1) if sandbox_rss else None,
+        }
+
+        report = summarize(results, wall, memory)
+        report["config"] = {
+            "analysts": args.analysts,
+            "turns": args.turns,
+            "db": db_uri.split(":", 1)[0],
+            "llm_latency_ms": args.llm_latency_ms,
+            "llm_requests": stub.requests_served,
+        }
+        print_report(report)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            print(f"\n💾 Report saved to {args.json}")
+    finally:
+        if sandbox is not None:
+            sandbox.terminate()
+            try:
+                sandbox.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                sandbox.kill()
+        stub.stop()
+        if args.keep:
+            print(f"📁 Kept {root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
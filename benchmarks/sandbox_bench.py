@@ -0,0 +1,376 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+import requests
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+# Micro-benchmarks for the execution layer (sandbox/server.py, kernel_engine.py),
+# run locally without Docker:
+#   cold start / restart, trivial-cell round trip, throughput with N clients,
+#   cost of emitting images by figure size, large stdout.
+# Results are flat "metric -> number" so two runs (two commits) can be compared:
+#   python -m benchmarks.sandbox_bench --json base.json
+#   python -m benchmarks.sandbox_bench --compare base.json
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from benchmarks.load_test import (  # noqa: E402
+    _free_port,
+    _rss_mb,
+    percentiles,
+    start_sandbox,
+)
+from sandbox import wire  # noqa: E402
+
+SUITES = ("cold", "restart", "rtt", "throughput", "images", "stdout")
+
+# (width, height, dpi) of the benchmark figures
+FIGURE_SIZES = [(4, 3, 100), (8, 6, 100), (12, 9, 150), (16, 12, 200)]
+STDOUT_SIZES_KB = [10, 100, 1_000, 10_000]
+
+PLOT_CODE = """
+import numpy as np
+import matplotlib.pyplot as plt
+fig = plt.figure(figsize=({w}, {h}), dpi={dpi})
+x = np.random.default_rng(0).normal(size=(2, 5000))
+plt.scatter(x[0], x[1], s=2)
+{emit}
+plt.close(fig)
+"""
+EMIT = {
+    "savefig": "plt.savefig('bench_{w}x{h}_{dpi}.png')",
+    # the kernel runs on Agg, so rendered PNG bytes are what reaches display_data
+    "display": (
+        "import io; from IPython.display import Image, display\n"
+        "buf = io.BytesIO(); fig.savefig(buf, format='png')\n"
+        "display(Image(buf.getvalue()))"
+    ),
+}
+
+
+def git_info():
+    def _git(*args):
+        try:
+            return subprocess.check_output(
+                ["git", *args], cwd=REPO_DIR, stderr=subprocess.DEVNULL, text=True
+            ).strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "subject": _git("log", "-1", "--format=%s"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+    }
+
+
+class Client:
+    """POSTs to a local sandbox; `framed` asks for the compact format (wire.py)."""
+
+    def __init__(self, base_url, framed=False):
+        self.base_url = base_url
+        self.session = requests.Session()
+        self.headers = wire.request_headers() if framed else {}
+
+    def execute(self, code, workspace=""):
+        """(ms, response bytes, result)"""
+        start = time.perf_counter()
+        r = self.session.post(
+            self.base_url + "/execute",
+            json={"code": code, "workspace": workspace},
+            headers=self.headers,
+            timeout=300,
+        )
+        r.raise_for_status()
+        if r.headers.get("Content-Type", "").startswith(wire.CONTENT_TYPE):
+            data = wire.decode(r.content)
+        else:
+            data = r.json()
+        return (time.perf_counter() - start) * 1000, len(r.content), data
+
+
+# --- suites ------------------------------------------------------------------
+def bench_cold(work_dir, runs):
+    """Sandbox process -> first answered cell; kernel start with / without helpers."""
+    from sandbox.kernel_engine import KernelEngine
+    from agent.execution import LocalKernel
+
+    server_ms = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = start_sandbox(work_dir, _free_port())
+        server_ms.append((time.perf_counter() - start) * 1000)
+        proc.terminate()
+        proc.wait(timeout=10)
+
+    bare_ms, preload_ms = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        engine = KernelEngine(work_dir, track_savefig=False)
+        bare_ms.append((time.perf_counter() - start) * 1000)
+        engine.shutdown()
+
+        start = time.perf_counter()
+        local = LocalKernel()  # savefig hook + datakit / modelkit, like the sandbox
+        preload_ms.append((time.perf_counter() - start) * 1000)
+        local.kernel.shutdown()
+
+    return {
+        "server_start_ms": float(np.median(server_ms)),
+        "kernel_start_bare_ms": float(np.median(bare_ms)),
+        "kernel_start_preload_ms": float(np.median(preload_ms)),
+    }
+
+
+def bench_restart(client, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        client.session.post(client.base_url + "/restart", timeout=60).raise_for_status()
+        # a restart is only over once the new kernel answers
+        client.execute("1")
+        times.append((time.perf_counter() - start) * 1000)
+    return {"restart_ms": float(np.median(times))}
+
+
+def bench_rtt(base_url, runs, work_dir):
+    from sandbox.kernel_engine import KernelEngine
+
+    out = {}
+    for name, framed in (("json", False), ("frames", True)):
+        client = Client(base_url, framed)
+        client.execute("1")  # warm up the connection
+        times = [client.execute("1")[0] for _ in range(runs)]
+        for k, v in percentiles(times).items():
+            out[f"rtt_http_{name}_{k}_ms"] = v
+
+    # Same cell without HTTP: what the local backend (or the server itself) pays
+    engine = KernelEngine(work_dir)
+    try:
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            engine.execute("1", work_dir)
+            times.append((time.perf_counter() - start) * 1000)
+    finally:
+        engine.shutdown()
+    for k, v in percentiles(times).items():
+        out[f"rtt_engine_{k}_ms"] = v
+    return out
+
+
+def bench_throughput(base_url, clients_list, duration, code):
+    out = {}
+    for n in clients_list:
+        deadline = time.perf_counter() + duration
+
+        def _client(i):
+            client = Client(base_url)
+            times = []
+            while time.perf_counter() < deadline:
+                times.append(client.execute(code, f"bench_c{i}")[0])
+            return times
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=n) as pool:
+            times = [t for ts in pool.map(_client, range(n)) for t in ts]
+        wall = time.perf_counter() - start
+        out[f"throughput_c{n}_rps"] = round(len(times) / wall, 2)
+        lat = percentiles(times)
+        out[f"throughput_c{n}_p50_ms"] = lat.get("p50")
+        out[f"throughput_c{n}_p99_ms"] = lat.get("p99")
+    return out
+
+
+def bench_images(client, runs, work_dir):
+    out = {}
+    client.execute("import matplotlib.pyplot as plt")  # import cost not counted
+    for mode, emit in EMIT.items():
+        for w, h, dpi in FIGURE_SIZES:
+            code = PLOT_CODE.format(
+                w=w, h=h, dpi=dpi, emit=emit.format(w=w, h=h, dpi=dpi)
+            )
+            times, sizes = [], []
+            for _ in range(runs):
+                ms, _, data = client.execute(code)
+                times.append(ms)
+                sizes.extend(
+                    os.path.getsize(os.path.join(work_dir, img))
+                    for img in data.get("images", [])[:1]
+                )
+            key = f"image_{mode}_{w}x{h}_{dpi}dpi"
+            out[f"{key}_ms"] = float(np.median(times))
+            out[f"{key}_kb"] = (
+                round(float(np.median(sizes)) / 1e3, 1) if sizes else None
+            )
+    return out
+
+
+def bench_stdout(base_url, runs):
+    out = {}
+    code = "import sys\nsys.stdout.write(('y' * 99 + '\\n') * {lines})"
+    for kb in STDOUT_SIZES_KB:
+        for name, framed in (("json", False), ("frames", True)):
+            client = Client(base_url, framed)
+            times, sizes = [], []
+            for _ in range(runs):
+                ms, size, _ = client.execute(code.format(lines=kb * 10))
+                times.append(ms)
+                sizes.append(size)
+            out[f"stdout_{kb}kb_{name}_ms"] = float(np.median(times))
+            out[f"stdout_{kb}kb_{name}_response_kb"] = round(np.median(sizes) / 1e3, 1)
+    return out
+
+
+# --- comparing runs ----------------------------------------------------------
+def higher_is_better(metric):
+    return metric.endswith("_rps")
+
+
+def compare(base, current, threshold):
+    """Rows (metric, base, current, change %, regressed) for metrics in both runs."""
+    rows = []
+    for name, new in current["metrics"].items():
+        old = base["metrics"].get(name)
+        if old is None or new is None or not old:
+            continue
+        change = 100 * (new - old) / old
+        worse = -change if higher_is_better(name) else change
+        rows.append((name, old, new, change, worse > threshold))
+    return rows
+
+
+def print_metrics(metrics):
+    for name, value in metrics.items():
+        print(f"   {name:<44}{'' if value is None else value:>12}")
+
+
+def print_comparison(rows, base, current, threshold):
+    commit = (base.get("git") or {}).get("commit") or "?"
+    print(f"\n🔁 Compared with {commit[:10]} (regression = worse by >{threshold}%)")
+    if base.get("machine") != current["machine"]:
+        print("⚠️  The base run was made on another machine / Python")
+    print(f"   {'metric':<44}{'base':>12}{'now':>12}{'change':>10}")
+    for name, old, new, change, regressed in rows:
+        flag = "  ❌" if regressed else ""
+        print(f"   {name:<44}{old:>12}{new:>12}{change:>+9.1f}%{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sandbox execution micro-benchmarks")
+    parser.add_argument("--only", default=",".join(SUITES), help="comma-separated")
+    parser.add_argument("--runs", type=int, default=5, help="cold/restart/image runs")
+    parser.add_argument("--rtt-runs", type=int, default=200)
+    parser.add_argument("--clients", default="1,2,4,8", help="throughput client counts")
+    parser.add_argument("--duration", type=float, default=5, help="seconds per count")
+    parser.add_argument("--throughput-code", default="x = sum(range(10_000))")
+    parser.add_argument("--json", default=None, help="write the results here")
+    parser.add_argument("--compare", default=None, help="results JSON of a base run")
+    parser.add_argument("--threshold", type=float, default=10, help="regression %%")
+    parser.add_argument("--keep", action="store_true", help="keep the temp folder")
+    args = parser.parse_args()
+
+    suites = [s.strip() for s in args.only.split(",") if s.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suites {sorted(unknown)}, expected {list(SUITES)}")
+
+    root = tempfile.mkdtemp(prefix="sandbox-bench-")
+    work_dir = os.path.join(root, "workspace")
+    os.makedirs(work_dir)
+    # LocalKernel (cold suite) reads config.WORKSPACE_DIR at import
+    os.environ["WORKSPACE_DIR"] = work_dir
+
+    metrics = {}
+    sandbox = None
+    try:
+        if "cold" in suites:
+            print("🧊 cold start...")
+            metrics.update(bench_cold(work_dir, args.runs))
+
+        port = _free_port()
+        sandbox = start_sandbox(work_dir, port)
+        base_url = f"http://127.0.0.1:{port}"
+        client = Client(base_url)
+
+        if "rtt" in suites:
+            print("🏓 trivial-cell round trip...")
+            metrics.update(bench_rtt(base_url, args.rtt_runs, work_dir))
+        if "throughput" in suites:
+            counts = [int(c) for c in args.clients.split(",")]
+            print(f"🚦 throughput with {counts} clients...")
+            metrics.update(
+                bench_throughput(base_url, counts, args.duration, args.throughput_code)
+            )
+        if "images" in suites:
+            print("🖼️ images by figure size...")
+            metrics.update(bench_images(client, args.runs, work_dir))
+        if "stdout" in suites:
+            print("📜 large stdout...")
+            metrics.update(bench_stdout(base_url, args.runs))
+        if "restart" in suites:
+            print("🔄 restart...")
+            metrics.update(bench_restart(client, args.runs))
+
+        rss = _rss_mb(sandbox.pid)
+        metrics["sandbox_rss_mb"] = round(rss, 1) if rss else None
+    finally:
+        if sandbox is not None:
+            sandbox.terminate()
+            try:
+                sandbox.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                sandbox.kill()
+        if args.keep:
+            print(f"📁 Kept {root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+    metrics = {
+        k: round(v, 2) if isinstance(v, float) else v for k, v in metrics.items()
+    }
+    results = {
+        "git": git_info(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {
+            "suites": suites,
+            "runs": args.runs,
+            "rtt_runs": args.rtt_runs,
+            "clients": args.clients,
+            "duration": args.duration,
+            "throughput_code": args.throughput_code,
+        },
+        "metrics": metrics,
+    }
+
+    print(f"\n📊 Sandbox benchmarks @ {(results['git']['commit'] or '?')[:10]}")
+    print_metrics(metrics)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results saved to {args.json}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            base = json.load(f)
+        rows = compare(base, results, args.threshold)
+        print_comparison(rows, base, results, args.threshold)
+        if any(r[4] for r in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import os
+import sys
+import ast
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from collections import defaultdict
+
+# How long `streamlit run app.py` spends importing before the first widget shows
+# up. Runs app.py's top-level imports in a fresh interpreter, so nothing is
+# cached between runs.
+#
+#   python -m benchmarks.startup                 # budget check (exit 1 if over)
+#   python -m benchmarks.startup --profile       # where the time goes (-X importtime)
+#
+# Heavy subsystems (langchain, embeddings, sqlalchemy, ydata-profiling) must be
+# loaded on first use; if one of them shows up after startup the check fails.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_TARGET = os.path.join(ROOT, "app.py")
+DEFAULT_BUDGET_MS = float(os.environ.get("STARTUP_BUDGET_MS", 1500))
+
+FORBIDDEN_MODULES = (
+    "langchain",
+    "langchain_core",
+    "langchain_community",
+    "langchain_openai",
+    "langgraph",
+    "sentence_transformers",
+    "torch",
+    "faiss",
+    "sqlalchemy",
+    "ydata_profiling",
+)
+
+# Runs in the child: imports one statement at a time. A third-party package
+# that isn't installed is skipped; any other import failure, and any failure
+# importing one of our own modules, is an error (the timing would be meaningless).
+CHILD_CODE = """
+import sys, json, time
+stmts = json.loads(sys.argv[1])
+forbidden = json.loads(sys.argv[2])
+missing, errors = [], []
+start = time.perf_counter()
+for stmt, first_party in stmts:
+    try:
+        exec(stmt, {})
+    except ModuleNotFoundError as e:
+        (errors if first_party else missing).append(f"{stmt}: {e}")
+    except ImportError as e:
+        errors.append(f"{stmt}: {e}")
+seconds = time.perf_counter() - start
+loaded = sorted({m for m in forbidden if m in sys.modules})
+print(json.dumps(
+    {"seconds": seconds, "missing": missing, "errors": errors, "loaded": loaded}
+))
+"""
+
+
+def is_first_party(module):
+    """utils, agent.backend, sandbox.wire... (a module or package of this repo)"""
+    top = module.split(".")[0]
+    return os.path.isfile(os.path.join(ROOT, f"{top}.py")) or os.path.isdir(
+        os.path.join(ROOT, top)
+    )
+
+
+def startup_imports(path):
+    """
+    The module-level import statements of a script (not those inside
+    functions), as [statement, imports one of our own modules].
+    """
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    stmts = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            modules = [node.module or ""] if node.level == 0 else ["."]
+        else:
+            continue
+        first_party = any(m == "." or is_first_party(m) for m in modules)
+        stmts.append([ast.unparse(node), first_party])
+    return stmts
+
+
+def run_child(stmts, forbidden=FORBIDDEN_MODULES, importtime=False):
+    """(wall seconds, child report, stderr) for one fresh interpreter."""
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    cmd += ["-c", CHILD_CODE, json.dumps(stmts), json.dumps(list(forbidden))]
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"startup import failed:\n{proc.stderr[-2000:]}")
+    return wall, json.loads(proc.stdout.strip().splitlines()[-1]), proc.stderr
+
+
+def interpreter_baseline(runs):
+    """Median wall time of `python -c pass` (interpreter start, nothing of ours)."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def parse_importtime(stderr):
+    """-X importtime lines -> [(depth, module, self_us, cumulative_us)]"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:") :].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us, cum_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue  # the header line
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((depth, name.strip(), self_us, cum_us))
+    return rows
+
+
+def interpreter_modules():
+    """Modules any `python -c pass` imports (site, encodings...): not ours."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "pass"],
+        capture_output=True,
+        text=True,
+    )
+    return {module for _, module, _, _ in parse_importtime(proc.stderr)}
+
+
+def summarize_importtime(rows, top=15, ignore=()):
+    rows = [r for r in rows if r[1] not in ignore]
+    by_package = defaultdict(int)
+    for _, module, self_us, _ in rows:
+        by_package[module.split(".")[0]] += self_us
+    # The least indented entries are what the script imported itself
+    min_depth = min((r[0] for r in rows), default=0)
+    direct = [r for r in rows if r[0] == min_depth]
+    return {
+        "total_ms": sum(r[2] for r in rows) / 1000,
+        "packages": [
+            {"package": pkg, "self_ms": us / 1000}
+            for pkg, us in sorted(by_package.items(), key=lambda kv: -kv[1])[:top]
+        ],
+        "direct": [
+            {"module": module, "cumulative_ms": cum_us / 1000}
+            for _, module, _, cum_us in sorted(direct, key=lambda r: -r[3])[:top]
+        ],
+    }
+
+
+def print_profile(summary, report):
+    print(f"\n⏱️  Import profile ({summary['total_ms']:.0f} ms of imports)")
+    print("\nSelf time by top-level package:")
+    for row in summary["packages"]:
+        print(f"  {row['package']:<28} {row['self_ms']:>9.1f} ms")
+    print("\nCumulative time of the modules imported directly:")
+    for row in summary["direct"]:
+        print(f"  {row['module']:<28} {row['cumulative_ms']:>9.1f} ms")
+    print_notes(report)
+
+
+def print_notes(report):
+    if report["errors"]:
+        print("\n❌ Failed imports (the timing does not cover them):")
+        for e in report["errors"]:
+            print(f"  {e}")
+    if report["missing"]:
+        print("\n⚠️  Not installed here (skipped):")
+        for m in report["missing"]:
+            print(f"  {m}")
+    if report["loaded"]:
+        print(f"\n❌ Heavy modules loaded at startup: {', '.join(report['loaded'])}")
+
+
+def run_budget(stmts, runs, budget_ms):
+    baseline = interpreter_baseline(runs)
+    walls, imports, report = [], [], None
+    for _ in range(runs):
+        wall, report, _ = run_child(stmts)
+        walls.append(wall)
+        imports.append(report["seconds"])
+    startup_ms = max(statistics.median(walls) - baseline, 0) * 1000
+    return {
+        "runs": runs,
+        "baseline_ms": baseline * 1000,
+        "startup_ms": startup_ms,
+        "import_ms": statistics.median(imports) * 1000,
+        "budget_ms": budget_ms,
+        "over_budget": startup_ms > budget_ms,
+        "missing": report["missing"],
+        "errors": report["errors"],
+        "loaded": report["loaded"],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="App startup import benchmark")
+    parser.add_argument("--target", default=DEFAULT_TARGET)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument(
+        "--profile", action="store_true", help="show -X importtime breakdown"
+    )
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", action="store_true", help="print JSON only")
+    args = parser.parse_args()
+
+    stmts = startup_imports(args.target)
+
+    if args.profile:
+        _, report, stderr = run_child(stmts, importtime=True)
+        summary = summarize_importtime(
+            parse_importtime(stderr), top=args.top, ignore=interpreter_modules()
+        )
+        summary.update(
+            missing=report["missing"], errors=report["errors"], loaded=report["loaded"]
+        )
+        if args.json:
+            print(json.dumps(summary, indent=2))
+        else:
+            print_profile(summary, report)
+        sys.exit(1 if report["loaded"] or report["errors"] else 0)
+
+    result = run_budget(stmts, args.runs, args.budget_ms)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(
+            f"\n🚀 Startup imports: {result['startup_ms']:.0f} ms "
+            f"(median of {result['runs']}, interpreter start "
+            f"{result['baseline_ms']:.0f} ms subtracted; in-process "
+            f"{result['import_ms']:.0f} ms), budget {result['budget_ms']:.0f} ms"
+        )
+        print_notes(result)
+        if result["over_budget"]:
+            print("❌ Over budget")
+    failed = result["over_budget"] or result["loaded"] or result["errors"]
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,233 @@
+import json
+import time
+import uuid
+import logging
+import argparse
+import threading
+from flask import Flask, Response, request, jsonify
+from werkzeug.serving import make_server
+
+# A tiny OpenAI-compatible /v1/chat/completions server for offline benchmarks.
+# It does not "think": every turn replays the same script of tool calls, one
+# step per model call, and then answers with a fixed text. Steps that use a
+# tool the agent was not given (e.g. no database) are skipped.
+
+PLOT_CODE = (
+    "import numpy as np\n"
+    "import matplotlib.pyplot as plt\n"
+    "x = np.random.default_rng(0).normal(size=5000)\n"
+    "plt.figure(figsize=(6, 4))\n"
+    "plt.hist(x, bins=50)\n"
+    "plt.savefig('bench_hist.png')\n"
+    "plt.close()\n"
+    "print('saved bench_hist.png')\n"
+)
+
+DESCRIBE_CODE = (
+    "import pandas as pd\n"
+    "import numpy as np\n"
+    "df = pd.DataFrame(np.random.default_rng(1).normal(size=(20000, 8)))\n"
+    "print(df.describe().round(3))\n"
+)
+
+# Each step is the list of tool calls of one AI message (several = parallel calls)
+DEFAULT_SCRIPT = [
+    [
+        {"name": "sql_db_list_tables", "args": {"tool_input": ""}},
+        {"name": "docker_python_tool", "args": {"code": DESCRIBE_CODE}},
+    ],
+    [{"name": "sql_db_query", "args": {"query": "SELECT COUNT(*) FROM churn"}}],
+    [{"name": "docker_python_tool", "args": {"code": PLOT_CODE}}],
+]
+
+FINAL_ANSWER = (
+    "Here is the summary you asked for. The distribution is roughly normal "
+    "and the chart has been saved to the workspace."
+)
+
+
+def _estimate_tokens(obj):
+    return max(1, len(json.dumps(obj, default=str)) // 4)
+
+
+def _offered_tools(body):
+    return {t.get("function", {}).get("name") for t in body.get("tools") or []}
+
+
+def _step_index(messages):
+    """Number of assistant messages since the last user message."""
+    n = 0
+    for msg in reversed(messages):
+        if msg.get("role") == "user":
+            break
+        if msg.get("role") == "assistant":
+            n += 1
+    return n
+
+
+def next_reply(body, script):
+    """(tool_calls, text) the stub sends back for this request."""
+    offered = _offered_tools(body)
+    steps = [
+        [c for c in step if c["name"] in offered]
+        for step in script
+        if any(c["name"] in offered for c in step)
+    ]
+    idx = _step_index(body.get("messages", []))
+    if idx < len(steps):
+        calls = [
+            {
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+                "type": "function",
+                "function": {"name": c["name"], "arguments": json.dumps(c["args"])},
+            }
+            for c in steps[idx]
+        ]
+        return calls, ""
+    return [], FINAL_ANSWER
+
+
+def _chunk(cid, model, delta, finish=None, usage=None):
+    out = {
+        "id": cid,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+    }
+    if usage is not None:
+        out["choices"] = []
+        out["usage"] = usage
+    return "data: " + json.dumps(out) + "\n\n"
+
+
+def _stream(cid, model, calls, text, usage, include_usage, token_delay):
+    yield _chunk(cid, model, {"role": "assistant", "content": ""})
+    for i, call in enumerate(calls):
+        yield _chunk(cid, model, {"tool_calls": [dict(call, index=i)]})
+    # Text goes out word by word so time-to-first-token means something
+    for word in text.split(" ") if text else []:
+        if token_delay:
+            time.sleep(token_delay)
+        yield _chunk(cid, model, {"content": word + " "})
+    yield _chunk(cid, model, {}, finish="tool_calls" if calls else "stop")
+    if include_usage:
+        yield _chunk(cid, model, {}, usage=usage)
+    yield "data: [DONE]\n\n"
+
+
+def create_app(script=None, latency_ms=0, tokens_per_sec=0):
+    app = Flask(__name__)
+    script = script or DEFAULT_SCRIPT
+    token_delay = 1.0 / tokens_per_sec if tokens_per_sec else 0
+    stats = {"requests": 0}
+    lock = threading.Lock()
+
+    @app.route("/v1/models", methods=["GET"])
+    def models():
+        return jsonify({"object": "list", "data": [{"id": "stub", "object": "model"}]})
+
+    @app.route("/v1/chat/completions", methods=["POST"])
+    def chat_completions():
+        body = request.get_json(force=True)
+        with lock:
+            stats["requests"] += 1
+        if latency_ms:
+            time.sleep(latency_ms / 1000)
+
+        calls, text = next_reply(body, script)
+        model = body.get("model", "stub")
+        cid = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        prompt_tokens = _estimate_tokens(body.get("messages", []))
+        completion_tokens = _estimate_tokens(calls or text)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage")
+            return Response(
+                _stream(cid, model, calls, text, usage, include_usage, token_delay),
+                mimetype="text/event-stream",
+            )
+
+        message = {"role": "assistant", "content": text or None}
+        if calls:
+            message["tool_calls"] = calls
+        return jsonify(
+            {
+                "id": cid,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": message,
+                        "finish_reason": "tool_calls" if calls else "stop",
+                    }
+                ],
+                "usage": usage,
+            }
+        )
+
+    app.stats = stats
+    return app
+
+
+class StubLLMServer:
+    """Runs the stub in a background thread: `with StubLLMServer() as srv: srv.base_url`"""
+
+    def __init__(self, host="127.0.0.1", port=0, **app_kwargs):
+        self.app = create_app(**app_kwargs)
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)  # no per-request log
+        self._server = make_server(host, port, self.app, threaded=True)
+        self.base_url = f"http://{host}:{self._server.server_port}/v1"
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="stub-llm", daemon=True
+        )
+
+    @property
+    def requests_served(self):
+        return self.app.stats["requests"]
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+def load_script(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub LLM")
+    parser.add_argument("--port", type=int, default=1234)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--tokens-per-sec", type=float, default=0)
+    parser.add_argument(
+        "--script", default=None, help="JSON list of steps (lists of tool calls)"
+    )
+    args = parser.parse_args()
+
+    server = StubLLMServer(
+        port=args.port,
+        script=load_script(args.script) if args.script else None,
+        latency_ms=args.latency_ms,
+        tokens_per_sec=args.tokens_per_sec,
+    )
+    print(f"🤖 Stub LLM listening on {server.base_url}")
+    server._server.serve_forever()
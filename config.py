@@ -4,15 +4,64 @@ import os
 BASE_DIR = os.getcwd()
 
 # Workspace for the agent (mounted to Docker)
-WORKSPACE_DIR = os.path.join(BASE_DIR, "workspace")
-
-if not os.path.exists(WORKSPACE_DIR):
-    os.makedirs(WORKSPACE_DIR)
+WORKSPACE_DIR = os.environ.get("WORKSPACE_DIR", os.path.join(BASE_DIR, "workspace"))
+# (created on first use by whoever writes there, not at import)
 
 # Docker Execution Service URL
-DOCKER_EXEC_URL = "http://localhost:5000/execute"
+DOCKER_EXEC_URL = os.environ.get("DOCKER_EXEC_URL", "http://localhost:5000/execute")
+
+# Python execution backend for docker_python_tool:
+# "remote" = sandbox/server.py in Docker, "local" = jupyter kernel on this machine
+# (faster, but not isolated: only for trusted single-user setups)
+EXECUTION_BACKEND = os.environ.get("EXECUTION_BACKEND", "remote")
 
 # LLM Configuration
-LLM_BASE_URL = "http://localhost:1234/v1"
-LLM_API_KEY = "lm-studio"
-LLM_MODEL = "openai/gpt-oss-20b"
+# (env overrides are used by benchmarks/load_test.py to point at a stub LLM)
+LLM_BASE_URL = os.environ.get("LLM_BASE_URL", "http://localhost:1234/v1")
+LLM_API_KEY = os.environ.get("LLM_API_KEY", "lm-studio")
+LLM_MODEL = os.environ.get("LLM_MODEL", "openai/gpt-oss-20b")
+
+# Tool Execution
+# Max number of tool calls from one AI message that run at the same time
+TOOL_MAX_WORKERS = 4
+
+# Tracing (set TRACE_ENABLED=1, or use the sidebar toggle)
+TRACE_ENABLED = os.environ.get("TRACE_ENABLED", "0") == "1"
+TRACE_FILE = os.environ.get(
+    "TRACE_FILE", os.path.join(BASE_DIR, "traces", "spans.jsonl")
+)
+
+# Data Profiling (runs in a background process, cached by file content hash)
+REPORTS_DIR = os.path.join(WORKSPACE_DIR, ".reports")
+PROFILE_SAMPLE_ROWS = 5000
+
+# CSV -> Postgres bulk ingestion (COPY)
+INGEST_SAMPLE_ROWS = 10000  # rows used to infer column types
+INGEST_COPY_BUFFER = 1 << 20  # bytes sent to COPY per read
+
+# Chat rendering
+HISTORY_WINDOW = 30  # messages rendered per page of chat history
+THUMBS_DIR = os.path.join(WORKSPACE_DIR, ".thumbs")
+THUMB_MAX_SIZE = 480  # px, longest side of a history thumbnail
+
+# Session Workspaces (one folder per Streamlit session under workspace/sessions)
+SESSIONS_DIR = os.path.join(WORKSPACE_DIR, "sessions")
+# WORKSPACE_DIR as mounted in the sandbox (same path when it runs without Docker)
+SANDBOX_WORKSPACE_DIR = os.environ.get("SANDBOX_WORKSPACE_DIR", "/app/workspace")
+WORKSPACE_QUOTA_BYTES = 500 * 1024 * 1024  # per session, older artifacts evicted first
+SESSION_TTL_SECONDS = 24 * 3600  # workspaces of sessions idle longer are deleted
+WORKSPACE_GC_INTERVAL = 600  # seconds between GC sweeps
+# Shared caches next to the sessions (REPORTS_DIR, THUMBS_DIR), also swept by the
+# GC: files unused for CACHE_TTL_SECONDS go, then the least recently used ones
+# until the folder fits CACHE_MAX_BYTES
+CACHE_TTL_SECONDS = 7 * 24 * 3600
+CACHE_MAX_BYTES = 1024 * 1024 * 1024  # per cache folder
+
+# Streaming Profile Engine (files above the threshold are never loaded whole)
+PROFILE_STREAMING_THRESHOLD = int(
+    os.environ.get("PROFILE_STREAMING_THRESHOLD", 200 * 1024 * 1024)
+)  # bytes
+PROFILE_CHUNK_ROWS = int(os.environ.get("PROFILE_CHUNK_ROWS", 200_000))
+PROFILE_WORKERS = int(
+    os.environ.get("PROFILE_WORKERS", max(1, (os.cpu_count() or 2) - 1))
+)
@@ -0,0 +1,197 @@
+import io
+import os
+import re
+import time
+import pandas as pd
+from config import INGEST_SAMPLE_ROWS, INGEST_COPY_BUFFER
+from tracing import span
+
+# Column names that usually identify rows / join keys -> worth an index:
+# id, customer_id, CustomerId, RowNumber, ..._key, ..._code (not "Paid", "Valid")
+KEY_COLUMN_PATTERN = re.compile(r"(?i:(^|_)id|number|_key|_code)$|[a-z0-9]I[dD]$")
+MAX_AUTO_INDEXES = 3
+
+
+def quote_ident(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def table_name_for(file_name):
+    """'Churn Modelling (2).csv' -> 'churn_modelling_2'"""
+    base = os.path.splitext(os.path.basename(file_name))[0].lower()
+    name = re.sub(r"[^a-z0-9_]+", "_", base).strip("_") or "dataset"
+    return f"t_{name}" if name[0].isdigit() else name
+
+
+def infer_pg_types(sample_df):
+    """Maps each column of a sample to a Postgres type."""
+    types = {}
+    for col in sample_df.columns:
+        s = sample_df[col]
+        if pd.api.types.is_bool_dtype(s):
+            types[col] = "BOOLEAN"
+        elif pd.api.types.is_integer_dtype(s):
+            types[col] = "BIGINT"
+        elif pd.api.types.is_float_dtype(s):
+            types[col] = "DOUBLE PRECISION"
+        elif pd.api.types.is_datetime64_any_dtype(s):
+            types[col] = "TIMESTAMP"
+        else:
+            non_null = s.dropna().astype(str)
+            parsed = pd.to_datetime(non_null, errors="coerce", format="mixed")
+            looks_like_date = (
+                len(non_null) > 0
+                and parsed.notna().all()
+                and non_null.str.contains(r"[-/:]").all()
+            )
+            types[col] = "TIMESTAMP" if looks_like_date else "TEXT"
+    return types
+
+
+def widen_types(types):
+    """Fallback when the sample guessed too narrow (e.g. ints that turn into floats)."""
+    widened = {}
+    for col, t in types.items():
+        if t == "BIGINT":
+            widened[col] = "DOUBLE PRECISION"
+        elif t in ("BOOLEAN", "TIMESTAMP"):
+            widened[col] = "TEXT"
+        else:
+            widened[col] = t
+    return widened
+
+
+def guess_index_columns(sample_df, types):
+    """Key-like names first, then unique integer columns of the sample."""
+    by_name = [c for c in sample_df.columns if KEY_COLUMN_PATTERN.search(str(c))]
+    unique_ints = [
+        c
+        for c in sample_df.columns
+        if types[c] == "BIGINT" and c not in by_name and sample_df[c].is_unique
+    ]
+    return (by_name + unique_ints)[:MAX_AUTO_INDEXES]
+
+
+class _ProgressReader:
+    """File wrapper for COPY: counts bytes read and reports progress."""
+
+    def __init__(self, f, total_bytes, callback):
+        self._f = f
+        self._total = max(total_bytes, 1)
+        self._callback = callback
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self._f.read(size)
+        self.bytes_read += len(data)
+        if self._callback:
+            self._callback(min(self.bytes_read / self._total, 1.0))
+        return data
+
+
+def _create_table(cur, table, types, if_exists):
+    if if_exists == "replace":
+        cur.execute(f"DROP TABLE IF EXISTS {quote_ident(table)}")
+    cols = ", ".join(f"{quote_ident(c)} {t}" for c, t in types.items())
+    cur.execute(f"CREATE TABLE IF NOT EXISTS {quote_ident(table)} ({cols})")
+
+
+def copy_csv_to_postgres(csv_path, db_uri, table_name=None, if_exists="replace", progress=None):
+    """
+    Streams a CSV file into Postgres with COPY (no per-row INSERTs).
+    Column types come from a sample; if the rest of the file does not fit
+    them, the load is retried with wider types. Returns load statistics.
+    """
+    table = table_name or table_name_for(csv_path)
+    sample = pd.read_csv(csv_path, nrows=INGEST_SAMPLE_ROWS)
+    inferred = infer_pg_types(sample)
+    attempts = [inferred, widen_types(inferred), {c: "TEXT" for c in inferred}]
+
+    from sqlalchemy import create_engine
+
+    engine = create_engine(db_uri)
+    raw = engine.raw_connection()
+    start = time.perf_counter()
+    try:
+        with span("sql.ingest", table=table, bytes_in=os.path.getsize(csv_path)) as sp:
+            for i, types in enumerate(attempts):
+                cur = raw.cursor()
+                try:
+                    _create_table(cur, table, types, if_exists)
+                    col_list = ", ".join(quote_ident(c) for c in types)
+                    with open(csv_path, "r", encoding="utf-8", newline="") as f:
+                        reader = _ProgressReader(f, os.path.getsize(csv_path), progress)
+                        cur.copy_expert(
+                            f"COPY {quote_ident(table)} ({col_list}) "
+                            "FROM STDIN WITH (FORMAT csv, HEADER true)",
+                            reader,
+                            size=INGEST_COPY_BUFFER,
+                        )
+                    rows = cur.rowcount
+                    raw.commit()
+                    break
+                except Exception:
+                    raw.rollback()
+                    if i == len(attempts) - 1:
+                        raise
+                finally:
+                    cur.close()
+
+            # Indexes after the load: one sort per index instead of per-row updates
+            indexes = guess_index_columns(sample, types)
+            cur = raw.cursor()
+            for col in indexes:
+                cur.execute(
+                    f"CREATE INDEX IF NOT EXISTS {quote_ident(f'ix_{table}_{col}'[:63])} "
+                    f"ON {quote_ident(table)} ({quote_ident(col)})"
+                )
+            cur.execute(f"ANALYZE {quote_ident(table)}")
+            if rows is None or rows < 0:
+                cur.execute(f"SELECT count(*) FROM {quote_ident(table)}")
+                rows = cur.fetchone()[0]
+            raw.commit()
+            cur.close()
+            sp.set(rows=rows)
+    finally:
+        raw.close()
+        engine.dispose()
+
+    seconds = time.perf_counter() - start
+    return {
+        "table": table,
+        "rows": rows,
+        "seconds": seconds,
+        "rows_per_sec": rows / seconds if seconds > 0 else float(rows),
+        "types": types,
+        "indexes": indexes,
+    }
+
+
+def copy_dataframe(df, table, engine, if_exists="replace", chunksize=100_000):
+    """DataFrame version of the COPY path (replaces `df.to_sql` for bulk loads)."""
+    if isinstance(engine, str):
+        from sqlalchemy import create_engine
+
+        engine = create_engine(engine)
+
+    # Let pandas create the (empty) table so dtypes map the usual way
+    df.head(0).to_sql(table, engine, if_exists=if_exists, index=False)
+    col_list = ", ".join(quote_ident(c) for c in df.columns)
+
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        for start in range(0, len(df), chunksize):
+            buf = io.StringIO()
+            df.iloc[start : start + chunksize].to_csv(buf, index=False, header=False)
+            buf.seek(0)
+            cur.copy_expert(
+                f"COPY {quote_ident(table)} ({col_list}) FROM STDIN WITH (FORMAT csv)",
+                buf,
+                size=INGEST_COPY_BUFFER,
+            )
+        raw.commit()
+        cur.close()
+    finally:
+        raw.close()
+    return len(df)
@@ -0,0 +1,443 @@
+import os
+import math
+import html
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from config import PROFILE_CHUNK_ROWS, PROFILE_WORKERS, PROFILE_STREAMING_THRESHOLD
+
+# One-pass, chunked dataset statistics for files larger than RAM. Every
+# statistic is a small mergeable summary, so chunks can be profiled in any
+# process and merged afterwards.
+HLL_PRECISION = 12  # 4096 registers, ~1.6% standard error
+SKETCH_SIZE = 2048  # points kept per column for quantiles
+TOPK_CAPACITY = 64  # counters kept per column (top-k is read from these)
+QUANTILES = (0.01, 0.25, 0.5, 0.75, 0.99)
+
+
+class HyperLogLog:
+    """Distinct-count sketch over 64-bit hashes."""
+
+    def __init__(self, p=HLL_PRECISION):
+        self.p = p
+        self.registers = np.zeros(1 << p, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        if len(hashes) == 0:
+            return
+        bits = 64 - self.p
+        idx = (hashes >> np.uint64(bits)).astype(np.int64)
+        rest = hashes & np.uint64((1 << bits) - 1)
+        # rank = position of the first 1-bit in the remaining `bits` bits.
+        # rest < 2**52, so the float conversion in frexp is exact.
+        rank = np.full(len(rest), bits + 1, dtype=np.uint8)
+        nz = rest > 0
+        _, exp = np.frexp(rest[nz].astype(np.float64))
+        rank[nz] = (bits - exp + 1).astype(np.uint8)
+        np.maximum.at(self.registers, idx, rank)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # small-range correction
+        return int(round(estimate))
+
+
+class QuantileSketch:
+    """
+    Weighted equi-depth summary for approximate quantiles. When it grows
+    past `size` points it is compressed to `size` points of equal weight,
+    each compression adding at most 1/size of rank error.
+    """
+
+    def __init__(self, size=SKETCH_SIZE):
+        self.size = size
+        self.values = np.empty(0, dtype=np.float64)
+        self.weights = np.empty(0, dtype=np.float64)
+
+    @property
+    def n(self):
+        return float(self.weights.sum())
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        self._absorb(values, np.ones(len(values)))
+
+    def merge(self, other):
+        self._absorb(other.values, other.weights)
+
+    def _absorb(self, values, weights):
+        self.values = np.concatenate([self.values, values])
+        self.weights = np.concatenate([self.weights, weights])
+        if len(self.values) > self.size:
+            order = np.argsort(self.values, kind="stable")
+            v, cum = self.values[order], np.cumsum(self.weights[order])
+            total = cum[-1]
+            targets = (np.arange(self.size) + 0.5) * total / self.size
+            self.values = v[np.searchsorted(cum, targets)]
+            self.weights = np.full(self.size, total / self.size)
+
+    def quantiles(self, qs=QUANTILES):
+        if len(self.values) == 0:
+            return {}
+        order = np.argsort(self.values, kind="stable")
+        v, cum = self.values[order], np.cumsum(self.weights[order])
+        idx = np.searchsorted(cum, np.asarray(qs) * cum[-1])
+        return dict(zip(qs, v[np.minimum(idx, len(v) - 1)].tolist()))
+
+
+class TopK:
+    """
+    Misra-Gries frequent items, mergeable (Agarwal et al. 2012): at most
+    `capacity` counters. When there are more, the (capacity+1)-th largest count
+    is subtracted from every counter and the ones left at 0 are dropped, so a
+    count is never above the true frequency and at most `error` below it.
+    """
+
+    def __init__(self, capacity=TOPK_CAPACITY):
+        self.capacity = capacity
+        self.counts = {}
+        self.n = 0  # values seen
+
+    def add_counts(self, counts):
+        self._combine(counts, sum(int(c) for c in counts.values()))
+
+    def merge(self, other):
+        self._combine(other.counts, other.n)
+
+    def _combine(self, counts, n):
+        self.n += n
+        for value, c in counts.items():
+            self.counts[value] = self.counts.get(value, 0) + int(c)
+        if len(self.counts) > self.capacity:
+            cut = sorted(self.counts.values(), reverse=True)[self.capacity]
+            self.counts = {v: c - cut for v, c in self.counts.items() if c > cut}
+
+    @property
+    def error(self):
+        """Largest possible undercount of any value (0 = counts are exact)."""
+        return (self.n - sum(self.counts.values())) // (self.capacity + 1)
+
+    def top(self, k=5):
+        return sorted(self.counts.items(), key=lambda kv: kv[1], reverse=True)[:k]
+
+    def format_count(self, c):
+        # lower bounds once counters were cut
+        return f"≥{c:,}" if self.error else f"{c:,}"
+
+
+class ColumnStats:
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.nulls = 0
+        self.dtypes = set()
+        self.hll = HyperLogLog()
+        self.topk = TopK()
+        # numeric part (Chan et al. parallel mean/variance)
+        self.n_num = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.quantile_sketch = QuantileSketch()
+
+    def add(self, series):
+        non_null = series.dropna()
+        self.count += len(non_null)
+        self.nulls += len(series) - len(non_null)
+        self.dtypes.add(str(series.dtype))
+        if len(non_null) == 0:
+            return
+
+        self.hll.add_hashes(pd.util.hash_pandas_object(non_null, index=False).to_numpy())
+        self.topk.add_counts(non_null.value_counts(sort=False).to_dict())
+
+        if pd.api.types.is_numeric_dtype(non_null) and not pd.api.types.is_bool_dtype(non_null):
+            values = non_null.to_numpy(dtype=np.float64)
+            self._merge_moments(len(values), values.mean(), ((values - values.mean()) ** 2).sum())
+            lo, hi = values.min(), values.max()
+            self.min = lo if self.min is None else min(self.min, lo)
+            self.max = hi if self.max is None else max(self.max, hi)
+            self.quantile_sketch.add(values)
+
+    def _merge_moments(self, n, mean, m2):
+        total = self.n_num + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.n_num * n / total
+        self.n_num = total
+
+    def merge(self, other):
+        self.count += other.count
+        self.nulls += other.nulls
+        self.dtypes |= other.dtypes
+        self.hll.merge(other.hll)
+        self.topk.merge(other.topk)
+        if other.n_num:
+            self._merge_moments(other.n_num, other.mean, other.m2)
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+            self.quantile_sketch.merge(other.quantile_sketch)
+
+    @property
+    def dtype(self):
+        if len(self.dtypes) == 1:
+            return next(iter(self.dtypes))
+        if self.dtypes <= {"int64", "float64"}:
+            return "float64"  # ints with missing values in some chunks
+        return "mixed(" + ",".join(sorted(self.dtypes)) + ")"
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.n_num - 1)) if self.n_num > 1 else None
+
+    def to_dict(self):
+        out = {
+            "dtype": self.dtype,
+            "count": self.count,
+            "nulls": self.nulls,
+            "distinct_approx": self.hll.count(),
+            "top": self.topk.top(),
+            "top_error": self.topk.error,
+        }
+        if self.n_num:
+            out.update(
+                mean=self.mean,
+                std=self.std,
+                min=float(self.min),
+                max=float(self.max),
+                quantiles=self.quantile_sketch.quantiles(),
+            )
+        return out
+
+
+class CorrelationStats:
+    """Pairwise co-moments of numeric columns (pairwise-complete rows)."""
+
+    def __init__(self, columns, shift):
+        k = len(columns)
+        self.columns = list(columns)
+        # shifting by a rough mean keeps the sums well conditioned
+        self.shift = np.asarray(shift, dtype=np.float64)
+        self.n = np.zeros((k, k))
+        self.sx = np.zeros((k, k))
+        self.sxx = np.zeros((k, k))
+        self.sxy = np.zeros((k, k))
+
+    def add(self, df):
+        if not self.columns:
+            return
+        block = df[self.columns].apply(pd.to_numeric, errors="coerce").to_numpy(np.float64)
+        mask = ~np.isnan(block)
+        x = np.where(mask, block - self.shift, 0.0)
+        m = mask.astype(np.float64)
+        self.n += m.T @ m
+        self.sx += x.T @ m  # [i, j]: sum of x_i over rows where j is present
+        self.sxx += (x * x).T @ m
+        self.sxy += x.T @ x
+
+    def merge(self, other):
+        self.n += other.n
+        self.sx += other.sx
+        self.sxx += other.sxx
+        self.sxy += other.sxy
+
+    def matrix(self):
+        n, sx, sxx = self.n, self.sx, self.sxx
+        cov = n * self.sxy - sx * sx.T
+        var_i = n * sxx - sx * sx
+        var_j = var_i.T
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = cov / np.sqrt(var_i * var_j)
+        corr[n < 2] = np.nan
+        return pd.DataFrame(np.clip(corr, -1, 1), index=self.columns, columns=self.columns)
+
+
+class DatasetProfile:
+    """Mergeable profile of a whole dataset."""
+
+    def __init__(self, columns, numeric_columns, shift):
+        self.rows = 0
+        self.columns = {c: ColumnStats(c) for c in columns}
+        self.corr = CorrelationStats(numeric_columns, shift)
+        self.head = None
+
+    def add(self, df):
+        self.rows += len(df)
+        for name, stats in self.columns.items():
+            if name in df.columns:
+                stats.add(df[name])
+        self.corr.add(df)
+
+    def merge(self, other):
+        self.rows += other.rows
+        for name, stats in other.columns.items():
+            self.columns[name].merge(stats)
+        self.corr.merge(other.corr)
+        if self.head is None:
+            self.head = other.head
+        return self
+
+    def top_correlations(self, k=5):
+        corr = self.corr.matrix()
+        pairs = []
+        cols = list(corr.columns)
+        for i in range(len(cols)):
+            for j in range(i + 1, len(cols)):
+                v = corr.iat[i, j]
+                if not np.isnan(v):
+                    pairs.append((cols[i], cols[j], float(v)))
+        return sorted(pairs, key=lambda p: abs(p[2]), reverse=True)[:k]
+
+    def to_dict(self):
+        return {
+            "rows": self.rows,
+            "columns": {c: s.to_dict() for c, s in self.columns.items()},
+            "top_correlations": self.top_correlations(),
+        }
+
+    def to_llm_summary(self):
+        """Same shape of text as utils.get_llm_friendly_summary, plus column stats."""
+        lines = [
+            f"DATASET SHAPE: ({self.rows}, {len(self.columns)})",
+            f"COLUMNS: {', '.join(self.columns)}",
+            f"MISSING: { {c: s.nulls for c, s in self.columns.items()} }",
+            "COLUMN STATS:",
+        ]
+        for name, s in self.columns.items():
+            line = f"  - {name} [{s.dtype}] distinct~{s.hll.count()}"
+            if s.n_num:
+                q = s.quantile_sketch.quantiles()
+                line += (
+                    f" mean={s.mean:.4g} std={(s.std or 0):.4g}"
+                    f" min={float(s.min):.4g} median~{q.get(0.5, float('nan')):.4g}"
+                    f" max={float(s.max):.4g}"
+                )
+            else:
+                top = ", ".join(
+                    f"{v!s}({s.topk.format_count(c)})" for v, c in s.topk.top(3)
+                )
+                line += f" top: {top}"
+            lines.append(line)
+        corrs = self.top_correlations()
+        if corrs:
+            lines.append(
+                "TOP CORRELATIONS: "
+                + ", ".join(f"{a}~{b}={v:+.2f}" for a, b, v in corrs)
+            )
+        if self.head is not None:
+            lines.append(f"HEAD:\n{self.head.to_string()}")
+        return "\n".join(lines) + "\n"
+
+    def to_html(self, title="Dataset Profile"):
+        """Lightweight stand-alone HTML report (no ydata needed)."""
+        rows = []
+        for name, s in self.columns.items():
+            d = s.to_dict()
+            q = d.get("quantiles", {})
+            top = ", ".join(
+                f"{html.escape(str(v))} ({s.topk.format_count(c)})" for v, c in d["top"]
+            )
+            cells = [
+                html.escape(str(name)),
+                d["dtype"],
+                f"{d['count']:,}",
+                f"{d['nulls']:,}",
+                f"{d['distinct_approx']:,}",
+                f"{d['mean']:.4g}" if "mean" in d else "",
+                f"{d['std']:.4g}" if d.get("std") is not None else "",
+                f"{d['min']:.4g}" if "min" in d else "",
+                f"{q.get(0.5, float('nan')):.4g}" if q else "",
+                f"{d['max']:.4g}" if "max" in d else "",
+                top,
+            ]
+            rows.append("<tr>" + "".join(f"<td>{c}</td>" for c in cells) + "</tr>")
+        header = "".join(
+            f"<th>{h}</th>"
+            for h in [
+                "Column", "Type", "Count", "Missing", "Distinct (≈)",
+                "Mean", "Std", "Min", "Median (≈)", "Max", "Top values",
+            ]
+        )
+        corr_html = self.corr.matrix().round(2).to_html() if self.corr.columns else ""
+        return (
+            f"<html><head><meta charset='utf-8'><title>{html.escape(title)}</title>"
+            "<style>body{font-family:sans-serif}table{border-collapse:collapse}"
+            "td,th{border:1px solid #ddd;padding:4px 8px;font-size:13px}</style></head>"
+            f"<body><h2>{html.escape(title)}</h2><p>Rows: {self.rows:,} · "
+            f"Columns: {len(self.columns)}</p>"
+            f"<table><tr>{header}</tr>{''.join(rows)}</table>"
+            f"<h3>Correlations (numeric columns)</h3>{corr_html}</body></html>"
+        )
+
+
+def iter_chunks(path, chunksize=PROFILE_CHUNK_ROWS):
+    """Yields DataFrames from a CSV or Parquet file without loading it whole."""
+    if path.lower().endswith((".parquet", ".pq")):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize, low_memory=False)
+
+
+def _profile_chunk(df, columns, numeric_columns, shift):
+    # Runs in a worker process; returns a partial profile to be merged
+    part = DatasetProfile(columns, numeric_columns, shift)
+    part.add(df)
+    return part
+
+
+def profile_file(path, chunksize=PROFILE_CHUNK_ROWS, workers=PROFILE_WORKERS):
+    """
+    Profiles a CSV/Parquet file in one pass. Chunks are farmed out to
+    `workers` processes (at most 2 chunks in flight per worker).
+    """
+    chunks = iter_chunks(path, chunksize)
+    first = next(chunks, None)
+    if first is None:
+        return DatasetProfile([], [], [])
+
+    columns = list(first.columns)
+    numeric = [
+        c
+        for c in columns
+        if pd.api.types.is_numeric_dtype(first[c]) and not pd.api.types.is_bool_dtype(first[c])
+    ]
+    shift = first[numeric].mean().fillna(0).to_numpy() if numeric else []
+
+    profile = DatasetProfile(columns, numeric, shift)
+    profile.add(first)
+    profile.head = first.head(3)
+
+    if workers <= 1:
+        for chunk in chunks:
+            profile.merge(_profile_chunk(chunk, columns, numeric, shift))
+        return profile
+
+    # spawn: safe from a threaded caller, workers don't inherit its state
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=mp.get_context("spawn")
+    ) as pool:
+        pending = []
+        for chunk in chunks:
+            pending.append(pool.submit(_profile_chunk, chunk, columns, numeric, shift))
+            if len(pending) >= 2 * workers:
+                profile.merge(pending.pop(0).result())
+        for fut in pending:
+            profile.merge(fut.result())
+    return profile
+
+
+def should_stream(path, threshold=PROFILE_STREAMING_THRESHOLD):
+    """True when a file is too big to profile in memory."""
+    return os.path.getsize(path) > threshold
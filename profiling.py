@@ -0,0 +1,195 @@
+import os
+import time
+import atexit
+import signal
+import hashlib
+import threading
+import multiprocessing as mp
+from config import REPORTS_DIR, PROFILE_SAMPLE_ROWS
+
+# Stages reported by the worker process (shared int, see _build_report)
+STAGES = ["Queued", "Reading CSV", "Profiling", "Writing report", "Done"]
+
+# One job per file content, shared by every session of this process
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def file_sha256(path, block_size=1 << 20):
+    """Content hash used as the report cache key."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def report_path_for(content_hash):
+    return os.path.join(REPORTS_DIR, f"{content_hash}.html")
+
+
+def summary_path_for(content_hash):
+    """LLM summary written by a streaming run (used to prime the agent)."""
+    return os.path.join(REPORTS_DIR, f"{content_hash}.summary.txt")
+
+
+def _write_atomic(path, text):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def _stop_children(signum, frame):
+    # cancel(): the pool workers of a streaming run go down with the job
+    for child in mp.active_children():
+        child.terminate()
+    os._exit(1)
+
+
+def _build_report(csv_path, out_path, summary_path, sample_rows, stage):
+    """Runs in the worker process. Heavy imports stay out of the Streamlit process."""
+    from profile_engine import profile_file, should_stream
+
+    signal.signal(signal.SIGTERM, _stop_children)
+
+    # Too big for pandas: one streaming pass, lightweight HTML report
+    if should_stream(csv_path):
+        stage.value = 2
+        profile = profile_file(csv_path)
+        stage.value = 3
+        # Summary first: once the report exists, so does the summary
+        _write_atomic(summary_path, profile.to_llm_summary())
+        _write_atomic(out_path, profile.to_html(os.path.basename(csv_path)))
+        stage.value = 4
+        return
+
+    import pandas as pd
+    from ydata_profiling import ProfileReport
+
+    stage.value = 1
+    df = pd.read_csv(csv_path)
+    if len(df) > sample_rows:
+        df = df.sample(n=sample_rows, random_state=42)
+
+    stage.value = 2
+    pr = ProfileReport(df, explorative=False, minimal=True)
+
+    stage.value = 3
+    # Write next to the final file, then rename, so readers never see half a report
+    tmp_path = out_path.replace(".html", f".{os.getpid()}.tmp.html")
+    pr.to_file(tmp_path)
+    os.replace(tmp_path, out_path)
+    stage.value = 4
+
+
+class ProfileJob:
+    """A profiling run in a separate process, with progress and cancellation."""
+
+    def __init__(self, csv_path, content_hash):
+        self.csv_path = csv_path
+        self.content_hash = content_hash
+        self.report_path = report_path_for(content_hash)
+        self.summary_path = summary_path_for(content_hash)
+        self.started_at = time.time()
+        self.cancelled = False
+
+        if os.path.exists(self.report_path):
+            self.cache_hit = True
+            self._process = None
+            self._stage = None
+            return
+
+        self.cache_hit = False
+        os.makedirs(REPORTS_DIR, exist_ok=True)
+        # 'spawn' so the worker doesn't inherit Streamlit's threads. Not a daemon:
+        # big files are profiled by a process pool started from inside the job
+        # (daemonic processes can't have children); _cancel_running_jobs stops
+        # it on exit instead.
+        ctx = mp.get_context("spawn")
+        self._stage = ctx.Value("i", 0)
+        self._process = ctx.Process(
+            target=_build_report,
+            args=(
+                csv_path,
+                self.report_path,
+                self.summary_path,
+                PROFILE_SAMPLE_ROWS,
+                self._stage,
+            ),
+        )
+        self._process.start()
+
+    @property
+    def status(self):
+        if os.path.exists(self.report_path):
+            return "done"
+        if self.cancelled:
+            return "cancelled"
+        if self._process is not None and self._process.is_alive():
+            return "running"
+        # also a cached report removed by the workspace GC: submit_profile rebuilds
+        return "failed"
+
+    @property
+    def stage(self):
+        if self.status == "done":
+            return len(STAGES) - 1
+        return self._stage.value if self._stage is not None else 0
+
+    @property
+    def progress(self):
+        return self.stage / (len(STAGES) - 1)
+
+    @property
+    def elapsed(self):
+        return time.time() - self.started_at
+
+    def summary(self, poll=0.5):
+        """
+        The LLM summary of a streaming run, waiting for the job if needed.
+        None when there is none (small file, job failed / cancelled, old report).
+        """
+        while True:
+            if os.path.exists(self.summary_path):
+                with open(self.summary_path, encoding="utf-8") as f:
+                    return f.read()
+            if self.status != "running":
+                return None
+            time.sleep(poll)
+
+    def cancel(self):
+        if self._process is not None and self._process.is_alive():
+            self.cancelled = True
+            self._process.terminate()
+            self._process.join(timeout=5)
+
+
+def submit_profile(csv_path, content_hash=None):
+    """
+    Returns the profiling job for this file's content. Re-uploads (from any
+    session) reuse the cached report or the job that is already running.
+    """
+    if content_hash is None:
+        content_hash = file_sha256(csv_path)
+
+    with _jobs_lock:
+        job = _jobs.get(content_hash)
+        if job is None or job.status in ("failed", "cancelled"):
+            job = ProfileJob(csv_path, content_hash)
+            _jobs[content_hash] = job
+        return job
+
+
+@atexit.register
+def _cancel_running_jobs():
+    with _jobs_lock:
+        jobs = list(_jobs.values())
+    for job in jobs:
+        job.cancel()
+
+
+def get_profile_job(content_hash):
+    """The current job for this content, without starting a new one."""
+    with _jobs_lock:
+        return _jobs.get(content_hash)
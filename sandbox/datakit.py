@@ -0,0 +1,378 @@
+import os
+import re
+import time
+import hashlib
+import tempfile
+import pandas as pd
+
+# Memory-optimized loading helpers. Preloaded into the sandbox kernel
+# (see server.py) so the agent can call them without imports.
+
+# object columns with fewer distinct values than this share of rows -> category
+CATEGORY_MAX_RATIO = 0.5
+
+
+def _mb(df):
+    return df.memory_usage(deep=True).sum() / 1e6
+
+
+def optimize_dtypes(
+    df, categorize=True, category_ratio=CATEGORY_MAX_RATIO, use_arrow=False
+):
+    """
+    Shrinks a DataFrame in place of re-reading it:
+    ints are downcast, floats go to float32 only if no value changes,
+    low-cardinality strings become category (others pyarrow strings if asked).
+    Note: arithmetic on downcast ints stays in the small dtype, use
+    `.astype('int64')` before multiplying large values.
+    """
+    for col in df.columns:
+        s = df[col]
+        if pd.api.types.is_bool_dtype(s):
+            continue
+        if pd.api.types.is_integer_dtype(s):
+            # signed on purpose: unsigned columns wrap around on subtraction
+            df[col] = pd.to_numeric(s, downcast="integer")
+        elif pd.api.types.is_float_dtype(s):
+            as32 = s.astype("float32")
+            if ((as32.astype("float64") == s) | s.isna()).all():
+                df[col] = as32
+        elif s.dtype == object or pd.api.types.is_string_dtype(s):
+            if (
+                categorize
+                and len(s)
+                and s.nunique(dropna=True) / len(s) < category_ratio
+            ):
+                df[col] = s.astype("category")
+            elif use_arrow:
+                df[col] = s.astype("string[pyarrow]")
+    return df
+
+
+def _concat_chunks(chunks):
+    """Concatenates optimized chunks without losing their category dtypes."""
+    cat_cols = {
+        c
+        for chunk in chunks
+        for c in chunk.columns
+        if isinstance(chunk[c].dtype, pd.CategoricalDtype)
+    }
+    for col in cat_cols:
+        categories = pd.Index([])
+        for chunk in chunks:
+            values = (
+                chunk[col].cat.categories
+                if isinstance(chunk[col].dtype, pd.CategoricalDtype)
+                else chunk[col].dropna().unique()
+            )
+            categories = categories.union(pd.Index(values))
+        dtype = pd.CategoricalDtype(categories)
+        for chunk in chunks:
+            chunk[col] = chunk[col].astype(dtype)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def _report(df, before_mb, label):
+    after_mb = _mb(df)
+    saved = 100 * (1 - after_mb / before_mb) if before_mb else 0.0
+    df.attrs["memory_report"] = {"before_mb": before_mb, "after_mb": after_mb}
+    print(
+        f"📉 {label}: {df.shape[0]:,} rows, memory {before_mb:.1f} MB -> {after_mb:.1f} MB (-{saved:.0f}%)"
+    )
+
+
+def _load(frames, optimize_kwargs, report, label):
+    """frames: one DataFrame or an iterator of chunks."""
+    if isinstance(frames, pd.DataFrame):
+        before = _mb(frames)
+        df = optimize_dtypes(frames, **optimize_kwargs)
+    else:
+        # Chunked: only one un-optimized chunk is in memory at a time
+        before, chunks = 0.0, []
+        for chunk in frames:
+            before += _mb(chunk)
+            chunks.append(optimize_dtypes(chunk, **optimize_kwargs))
+        df = _concat_chunks(chunks) if chunks else pd.DataFrame()
+        # strings that looked unique per chunk may still be low-cardinality overall
+        df = optimize_dtypes(df, **optimize_kwargs)
+    if report:
+        _report(df, before, label)
+    return df
+
+
+def load_csv(
+    path,
+    chunksize=None,
+    downcast=True,
+    categorize=True,
+    use_arrow=False,
+    report=True,
+    **read_kwargs,
+):
+    """
+    pd.read_csv with smaller dtypes. `chunksize` keeps peak memory low,
+    `use_arrow` uses the pyarrow parser and arrow-backed dtypes.
+    """
+    if use_arrow and chunksize is None:
+        read_kwargs.setdefault("engine", "pyarrow")
+        read_kwargs.setdefault("dtype_backend", "pyarrow")
+    frames = pd.read_csv(path, chunksize=chunksize, **read_kwargs)
+    if not downcast:
+        return frames if chunksize is None else pd.concat(frames, ignore_index=True)
+    kwargs = {"categorize": categorize, "use_arrow": use_arrow}
+    return _load(frames, kwargs, report, path.rsplit("/", 1)[-1])
+
+
+def load_sql(
+    query,
+    uri,
+    chunksize=None,
+    downcast=True,
+    categorize=True,
+    use_arrow=False,
+    report=True,
+    **read_kwargs,
+):
+    """pd.read_sql with the same dtype optimization as load_csv."""
+    frames = pd.read_sql(query, uri, chunksize=chunksize, **read_kwargs)
+    if not downcast:
+        return frames if chunksize is None else pd.concat(frames, ignore_index=True)
+    kwargs = {"categorize": categorize, "use_arrow": use_arrow}
+    return _load(frames, kwargs, report, "query")
+
+
+# --- Fast SQL -> pandas ---------------------------------------------------------
+# Postgres: COPY (query) TO STDOUT as CSV into a temp file, parsed by pyarrow's
+# multithreaded reader with the column types from the query. Anything else:
+# server-side cursor, fetched in batches. Either way no per-row Python tuples
+# for the whole result at once.
+
+# Postgres type OIDs -> pyarrow types for the COPY reader (others: inferred)
+_PG_ARROW_TYPES = {
+    16: "bool",
+    20: "int64",
+    21: "int16",
+    23: "int32",
+    700: "float32",
+    701: "float64",
+    1700: "float64",
+    25: "string",
+    1042: "string",
+    1043: "string",
+    1082: "date32",
+    1114: "timestamp[us]",
+}
+
+SQL_CACHE_PREFIX = "sqlcache_"
+
+
+def _is_postgres(uri):
+    return uri.split(":", 1)[0].split("+", 1)[0] in ("postgresql", "postgres")
+
+
+def _pg_dsn(uri):
+    # psycopg2 takes "postgresql://..." but not the SQLAlchemy "+driver" part
+    scheme, rest = uri.split(":", 1)
+    return scheme.split("+", 1)[0] + ":" + rest
+
+
+def _wrap_query(query, max_rows=None, sample=None):
+    q = query.strip().rstrip(";")
+    if sample:
+        q = f"SELECT * FROM ({q}) AS _sample WHERE random() < {float(sample)}"
+    if max_rows:
+        q = f"SELECT * FROM ({q}) AS _capped LIMIT {int(max_rows)}"
+    return q
+
+
+def _table_versions(query, uri):
+    """
+    Version stamp of the tables the query mentions, or None if unknown.
+    Postgres: write counters from pg_stat_user_tables plus the relation's
+    filenode (changes on TRUNCATE). The counters are flushed by the server
+    with a small delay, so a write in the last second may not be seen yet.
+    SQLite: the database file's mtime.
+    """
+    if _is_postgres(uri):
+        import psycopg2
+
+        conn = psycopg2.connect(_pg_dsn(uri))
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT schemaname, relname, n_tup_ins, n_tup_upd, n_tup_del, "
+                    "pg_relation_filenode(relid) FROM pg_stat_user_tables"
+                )
+                rows = cur.fetchall()
+        finally:
+            conn.close()
+        words = set(re.findall(r"[a-z_][a-z0-9_$]*", query.lower()))
+        used = sorted(r for r in rows if r[1].lower() in words)
+        return repr(used) if used else None
+    if uri.startswith("sqlite:///"):
+        path = uri[len("sqlite:///") :]
+        return repr(os.path.getmtime(path)) if os.path.exists(path) else None
+    return None
+
+
+def _cache_path(cache_dir, query, uri, versions, options):
+    key = hashlib.sha256(
+        "\x00".join([query.strip(), uri, versions, repr(options)]).encode()
+    ).hexdigest()[:24]
+    return os.path.join(cache_dir, f"{SQL_CACHE_PREFIX}{key}.parquet")
+
+
+def _pg_copy(query, uri, seed):
+    """COPY (query) TO STDOUT -> temp CSV -> pyarrow Table (typed from the query)."""
+    import psycopg2
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    conn = psycopg2.connect(_pg_dsn(uri))
+    try:
+        with conn.cursor() as cur:
+            # Column types without running the query
+            cur.execute(f"SELECT * FROM ({query}) AS _q LIMIT 0")
+            types = {
+                d.name: _PG_ARROW_TYPES[d.type_code]
+                for d in cur.description
+                if d.type_code in _PG_ARROW_TYPES
+            }
+            if seed is not None:
+                cur.execute("SELECT setseed(%s)", ((seed % 1000) / 1000,))
+            with tempfile.NamedTemporaryFile(suffix=".csv") as f:
+                cur.copy_expert(
+                    f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true)", f
+                )
+                f.flush()
+                return pacsv.read_csv(
+                    f.name,
+                    convert_options=pacsv.ConvertOptions(
+                        column_types={
+                            k: pa.type_for_alias(v) for k, v in types.items()
+                        },
+                        true_values=["t"],
+                        false_values=["f"],
+                        strings_can_be_null=True,  # NULL is an empty unquoted field
+                        quoted_strings_can_be_null=False,  # "" is an empty string
+                    ),
+                )
+    finally:
+        conn.close()
+
+
+def _cursor_batches(query, uri, batch_rows):
+    """Server-side cursor: yields DataFrames of `batch_rows` rows."""
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine(uri)
+    try:
+        with engine.connect() as conn:
+            result = conn.execution_options(
+                stream_results=True, max_row_buffer=batch_rows
+            ).execute(text(query))
+            columns = list(result.keys())
+            while True:
+                rows = result.fetchmany(batch_rows)
+                if not rows:
+                    break
+                yield pd.DataFrame.from_records(rows, columns=columns)
+    finally:
+        engine.dispose()
+
+
+def read_sql_fast(
+    query,
+    uri,
+    max_rows=None,
+    sample=None,
+    seed=0,
+    cache=True,
+    cache_dir=".",
+    batch_rows=100_000,
+    downcast=True,
+    use_arrow=False,
+    report=True,
+):
+    """
+    Faster, leaner `pd.read_sql` for big results.
+    - Postgres: COPY ... TO STDOUT into Arrow; other DBs: server-side cursor batches.
+    - `max_rows`: row cap. `sample`: keep this fraction of rows (0-1, random()
+      in the database; `seed` makes it repeatable).
+    - Results are cached as Parquet (sqlcache_*.parquet in `cache_dir`), keyed by
+      the query and the versions of the tables it reads; a write to those tables
+      means a fresh read. `cache=False` always queries.
+    """
+    start = time.perf_counter()
+    options = (max_rows, sample, seed if sample else None, downcast, use_arrow)
+
+    path = None
+    if cache:
+        versions = _table_versions(query, uri)
+        if versions is not None:
+            path = _cache_path(cache_dir, query, uri, versions, options)
+            if os.path.exists(path):
+                df = pd.read_parquet(path)
+                if report:
+                    print(
+                        f"⚡ read_sql_fast: {len(df):,} rows from cache "
+                        f"({os.path.basename(path)}) in {time.perf_counter() - start:.2f}s"
+                    )
+                return df
+
+    kwargs = {"categorize": True, "use_arrow": use_arrow}
+    if _is_postgres(uri):
+        table = _pg_copy(
+            _wrap_query(query, max_rows, sample), uri, seed if sample else None
+        )
+        df = table.to_pandas(types_mapper=pd.ArrowDtype if use_arrow else None)
+        del table
+        source = "COPY"
+        if downcast:
+            df = _load(df, kwargs, False, "query")
+    else:
+        batches = _cursor_batches(query, uri, batch_rows)
+        if sample or max_rows:
+            batches = _sample_batches(batches, max_rows, sample, seed)
+        if downcast:
+            df = _load(batches, kwargs, False, "query")
+        else:
+            frames = list(batches)
+            df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        source = "cursor"
+
+    if path is not None:
+        tmp = path + ".tmp"
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+    if report:
+        print(
+            f"⚡ read_sql_fast: {len(df):,} rows via {source} in "
+            f"{time.perf_counter() - start:.2f}s, {_mb(df):.1f} MB"
+            + (" (cached)" if path else "")
+        )
+    return df
+
+
+def _sample_batches(batches, max_rows, sample, seed):
+    """Sampling / row cap for the cursor path (the SQL may not have random())."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    kept = 0
+    for batch in batches:
+        if sample:
+            batch = batch[rng.random(len(batch)) < sample]
+        if max_rows:
+            batch = batch.iloc[: max_rows - kept]
+        kept += len(batch)
+        yield batch
+        if max_rows and kept >= max_rows:
+            return
+
+
+def memory_report(df):
+    """Per-column dtype and memory (MB), largest first."""
+    usage = df.memory_usage(deep=True, index=False) / 1e6
+    out = pd.DataFrame({"dtype": df.dtypes.astype(str), "memory_mb": usage.round(3)})
+    return out.sort_values("memory_mb", ascending=False)
@@ -0,0 +1,294 @@
+import os
+import re
+import ast
+import uuid
+import time
+import base64
+import threading
+import jupyter_client
+from subprocess import PIPE
+
+# Shared by sandbox/server.py (DockerKernel) and kernel.py (AgentKernel).
+# execute_interactive() waits on the iopub socket and hands each message of our
+# cell to an OutputCollector as it arrives: text is capped in memory (the rest
+# spills to a file in the workspace) and images are written straight to disk.
+
+# Text kept per execution; anything longer goes to output_<id>.txt and the
+# result keeps its head and tail
+MAX_OUTPUT_CHARS = int(os.environ.get("SANDBOX_MAX_OUTPUT_CHARS", 100_000))
+TAIL_SHARE = 0.25  # share of MAX_OUTPUT_CHARS kept from the end (tracebacks, totals)
+
+# Colour codes from tracebacks / progress bars, stripped as the output streams in
+ANSI_ESCAPE = re.compile(r"\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])")
+
+IMAGE_MIMES = {"image/png": "png", "image/jpeg": "jpg"}
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".svg")
+
+# Records the files written by savefig; read back through user_expressions so
+# nobody has to poll the workspace folder for new images
+SAVEFIG_HOOK = """
+import os as _agent_os
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.figure
+_agent_saved = []
+_agent_orig_savefig = matplotlib.figure.Figure.savefig
+def _agent_savefig(self, fname, *args, **kwargs):
+    _agent_orig_savefig(self, fname, *args, **kwargs)
+    if isinstance(fname, (str, _agent_os.PathLike)):
+        path = _agent_os.path.abspath(_agent_os.fspath(fname))
+        if not _agent_os.path.splitext(path)[1]:
+            path += '.' + (kwargs.get('format') or matplotlib.rcParams['savefig.format'])
+        _agent_saved.append(path)
+matplotlib.figure.Figure.savefig = _agent_savefig
+def _agent_take_saved():
+    out = list(_agent_saved)
+    _agent_saved.clear()
+    return out
+"""
+SAVED_EXPRESSION = {"saved": "_agent_take_saved()"}
+
+
+class OutputCollector:
+    """output_hook for execute_interactive: parses each iopub message as it comes."""
+
+    def __init__(self, work_dir, max_chars=None):
+        self.work_dir = work_dir
+        self.max_chars = max_chars or MAX_OUTPUT_CHARS
+        self.tail_chars = int(self.max_chars * TAIL_SHARE)
+        self.head_chars = self.max_chars - self.tail_chars
+        self.images = []
+        self._parts = []
+        self._chars = 0
+        self._tail = ""
+        self._spill = None
+        self.spill_path = None
+
+    def __call__(self, msg):
+        msg_type = msg["msg_type"]
+        content = msg["content"]
+
+        if msg_type == "stream":
+            self.write(content["text"])
+        elif msg_type in ("execute_result", "display_data"):
+            data = content.get("data", {})
+            if "text/plain" in data:
+                self.write(data["text/plain"])
+            for mime, ext in IMAGE_MIMES.items():
+                if mime in data:
+                    self._save_image(data[mime], ext)
+        elif msg_type == "error":
+            self.write(f"Error: {chr(10).join(content['traceback'])}")
+
+    def write(self, text):
+        text = ANSI_ESCAPE.sub("", text)
+        if self._spill is not None:
+            self._spill.write(text)
+            self._tail = (self._tail + text)[-self.tail_chars :]
+            return
+        if self._chars + len(text) <= self.max_chars:
+            self._parts.append(text)
+            self._chars += len(text)
+            return
+        # Over the cap: everything goes to a file, we keep the head and a tail
+        name = f"output_{uuid.uuid4().hex[:12]}.txt"
+        self.spill_path = os.path.join(self.work_dir, name)
+        self._spill = open(self.spill_path, "w", encoding="utf-8")
+        so_far = "".join(self._parts) + text
+        self._spill.write(so_far)
+        self._parts = [so_far[: self.head_chars]]
+        self._chars = self.head_chars
+        self._tail = so_far[self.head_chars :][-self.tail_chars :]
+
+    def _save_image(self, b64, ext):
+        # uuid names: several figures in the same millisecond can't collide
+        filename = f"{uuid.uuid4().hex[:12]}.{ext}"
+        with open(os.path.join(self.work_dir, filename), "wb") as f:
+            f.write(base64.b64decode(b64))
+        self.images.append(filename)
+
+    def add_saved_files(self, paths):
+        """Images written with savefig (absolute paths) -> names relative to work_dir."""
+        root = os.path.realpath(self.work_dir)
+        for path in paths:
+            if not path.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            real = os.path.realpath(path)
+            name = (
+                os.path.relpath(real, root) if real.startswith(root + os.sep) else real
+            )
+            if name not in self.images:
+                self.images.append(name)
+
+    def result(self):
+        logs = "".join(self._parts)
+        if self._spill is not None:
+            total = self._spill.tell()
+            self._spill.close()
+            logs += (
+                f"\n... [output truncated: {total:,} bytes in total, showing the "
+                f"first {self.head_chars:,} and last {len(self._tail):,} characters. "
+                f"Full output saved to {os.path.basename(self.spill_path)}] ...\n"
+                + self._tail
+            )
+        return {"logs": logs, "images": self.images}
+
+
+class KernelEngine:
+    """
+    One jupyter kernel. execute() returns {"logs", "error", "images"}, where
+    images are file names relative to the execution's work_dir.
+    """
+
+    def __init__(self, work_dir, preload_code="", track_savefig=True):
+        self.work_dir = work_dir
+        os.makedirs(self.work_dir, exist_ok=True)
+        self.preload_code = preload_code
+        self.track_savefig = track_savefig
+        self._lock = threading.Lock()  # one cell at a time per kernel
+        self.start()
+
+    def start(self):
+        self.kernel_manager = jupyter_client.KernelManager(kernel_name="python3")
+        self.kernel_manager.start_kernel(stdout=PIPE, stderr=PIPE)
+        self.kernel = self.kernel_manager.blocking_client()
+        self.kernel.start_channels()
+        self.kernel.wait_for_ready(timeout=10)
+
+        preload = (SAVEFIG_HOOK if self.track_savefig else "") + self.preload_code
+        if preload:
+            # execute_interactive drains this cell's iopub messages, so its
+            # 'idle' status can't end the next execute() early
+            self.kernel.execute_interactive(
+                preload, silent=True, timeout=30, output_hook=lambda msg: None
+            )
+
+    def shutdown(self):
+        try:
+            self.kernel.stop_channels()
+        finally:
+            self.kernel_manager.shutdown_kernel(now=True)
+
+    def restart(self):
+        with self._lock:
+            self.shutdown()
+            self.start()
+
+    def execute(self, code, work_dir=None, timeout=300):
+        with self._lock:
+            result, _ = self._run_cell(code, work_dir or self.work_dir, timeout)
+        return result
+
+    def execute_batch(
+        self, cells, work_dir=None, stop_on_error=True, setup="", timeout=300
+    ):
+        """
+        Runs `cells` in order while holding the kernel, so no other request can
+        interleave. `setup` runs first, once (imports, chdir). `timeout` covers
+        the whole batch. Returns {"cells": [...], "images", "seconds", "error"};
+        each cell has logs / error / images / status (ok, error, skipped) / seconds.
+        """
+        work_dir = work_dir or self.work_dir
+        start = time.perf_counter()
+        deadline = start + timeout
+        cells_out = []
+        error = None
+
+        with self._lock:
+            failed = False
+            if setup:
+                setup_result, status = self._run_cell(setup, work_dir, 30)
+                if status != "ok":
+                    failed = True
+                    error = setup_result["error"] or setup_result["logs"]
+
+            for code in cells:
+                if failed and (stop_on_error or error):
+                    cells_out.append(
+                        {
+                            "logs": "",
+                            "error": None,
+                            "images": [],
+                            "status": "skipped",
+                            "seconds": 0.0,
+                        }
+                    )
+                    continue
+                cell_start = time.perf_counter()
+                result, status = self._run_cell(
+                    code, work_dir, max(deadline - cell_start, 0.001)
+                )
+                result["status"] = status
+                result["seconds"] = round(time.perf_counter() - cell_start, 4)
+                cells_out.append(result)
+                failed = failed or status != "ok"
+
+        return {
+            "cells": cells_out,
+            "images": [img for c in cells_out for img in c["images"]],
+            "seconds": round(time.perf_counter() - start, 4),
+            "error": error,
+        }
+
+    def _run_cell(self, code, work_dir, timeout):
+        """One cell, lock already held. Returns (result dict, reply status)."""
+        collector = OutputCollector(work_dir)
+        error = None
+        reply = None
+        status = "error"
+
+        try:
+            reply = self.kernel.execute_interactive(
+                code,
+                timeout=timeout,
+                output_hook=collector,
+                user_expressions=SAVED_EXPRESSION if self.track_savefig else None,
+            )
+            status = reply["content"].get("status", "error")
+        except TimeoutError:
+            # Stop the cell so the next call doesn't queue behind it
+            self.kernel_manager.interrupt_kernel()
+            error = f"Execution timed out after {timeout:.0f}s"
+            self._settle()
+
+        if self.track_savefig:
+            # user_expressions are skipped when the cell raised: ask again
+            if status != "ok":
+                reply = self._quiet("", user_expressions=SAVED_EXPRESSION)
+            if reply is not None:
+                collector.add_saved_files(_saved_files(reply))
+
+        result = collector.result()
+        result["error"] = error
+        return result, status
+
+    def _quiet(self, code, timeout=10, **kwargs):
+        """Runs a silent cell; returns its reply (None if the kernel is stuck)."""
+        try:
+            return self.kernel.execute_interactive(
+                code,
+                silent=True,
+                timeout=timeout,
+                output_hook=lambda msg: None,
+                **kwargs,
+            )
+        except TimeoutError:
+            return None
+
+    def _settle(self):
+        # An interrupted cell ends with an error, and the kernel aborts requests
+        # queued behind it: let it finish before anyone sends the next cell
+        for _ in range(3):
+            reply = self._quiet("")
+            if reply is None or reply["content"].get("status") == "ok":
+                return
+
+
+def _saved_files(reply):
+    expr = reply["content"].get("user_expressions", {}).get("saved", {})
+    if expr.get("status") != "ok":
+        return []
+    try:
+        return ast.literal_eval(expr["data"]["text/plain"])
+    except (KeyError, ValueError, SyntaxError):
+        return []
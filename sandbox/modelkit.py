@@ -0,0 +1,389 @@
+import os
+import json
+import time
+import hashlib
+import numpy as np
+import pandas as pd
+
+# Model training helpers. Preloaded into the sandbox kernel next to datakit
+# (see server.py). Fitted models and SHAP values are cached on disk, keyed by
+# a fingerprint of the data + features + hyperparameters, so "now show the
+# feature importance" does not retrain the same model.
+# sklearn / shap / joblib are imported on first use: preloading stays cheap.
+
+MODEL_CACHE_PREFIX = "modelcache_"
+SHAP_CACHE_PREFIX = "shapcache_"
+
+# one-hot encode string columns with at most this many values, drop the others
+MAX_CATEGORIES = 50
+
+# name -> (classifier, regressor), as "module.Class"
+MODELS = {
+    "random_forest": (
+        "sklearn.ensemble.RandomForestClassifier",
+        "sklearn.ensemble.RandomForestRegressor",
+    ),
+    "extra_trees": (
+        "sklearn.ensemble.ExtraTreesClassifier",
+        "sklearn.ensemble.ExtraTreesRegressor",
+    ),
+    "gradient_boosting": (
+        "sklearn.ensemble.HistGradientBoostingClassifier",
+        "sklearn.ensemble.HistGradientBoostingRegressor",
+    ),
+    "logistic_regression": (
+        "sklearn.linear_model.LogisticRegression",
+        "sklearn.linear_model.Ridge",
+    ),
+}
+
+# linear models only converge (and have comparable coefficients) on scaled data
+SCALED_MODELS = {"logistic_regression"}
+
+# Fitted models / explainers of this kernel, so repeated calls skip even the disk
+_models = {}
+_explainers = {}
+
+
+class TrainedModel:
+    """What train_model returns: the fitted model, its data split and metrics."""
+
+    def __init__(self, model, key, task, features, columns, splits, metrics, seconds):
+        self.model = model
+        self.key = key
+        self.task = task
+        self.features = features  # input columns
+        self.columns = columns  # model columns (after one-hot encoding)
+        self.X_train, self.X_test, self.y_train, self.y_test = splits
+        self.metrics = metrics
+        self.seconds = seconds
+
+    def prepare(self, df):
+        """Encodes new rows the same way as the training data."""
+        X = pd.get_dummies(df[self.features], dtype="uint8")
+        X = X.reindex(columns=self.columns, fill_value=0)
+        return X.fillna(self.X_train.median(numeric_only=True))
+
+    def predict(self, df):
+        return self.model.predict(self.prepare(df))
+
+    def __repr__(self):
+        scores = ", ".join(f"{k}={v:.3f}" for k, v in self.metrics.items())
+        return (
+            f"TrainedModel({type(self.model).__name__}, {self.task}, "
+            f"{len(self.columns)} columns, {scores})"
+        )
+
+
+def _load_class(path):
+    import importlib
+
+    module, name = path.rsplit(".", 1)
+    return getattr(importlib.import_module(module), name)
+
+
+def _infer_task(y):
+    if pd.api.types.is_numeric_dtype(y) and y.nunique() > 20:
+        return "regression"
+    return "classification"
+
+
+def _prepare(df, target, features, max_categories):
+    """(X, y, features used, dropped columns) with strings one-hot encoded."""
+    guess = features is None
+    if guess:
+        features = [c for c in df.columns if c != target]
+    used, dropped = [], []
+    n = len(df)
+    for col in features:
+        s = df[col]
+        numeric = pd.api.types.is_numeric_dtype(s) or pd.api.types.is_bool_dtype(s)
+        if numeric:
+            # row ids / customer ids carry no signal, they just get memorized
+            unique = pd.api.types.is_integer_dtype(s) and s.nunique() == n
+            if guess and n > 1 and unique:
+                dropped.append(col)
+            else:
+                used.append(col)
+        elif not guess or s.nunique() <= max_categories:
+            used.append(col)
+        else:
+            dropped.append(col)
+    X = pd.get_dummies(df[used], dtype="uint8")
+    return X, df[target], used, dropped
+
+
+def _fingerprint(X, y):
+    """Hash of the exact values (and column names / dtypes) going into the model."""
+    h = hashlib.sha1()
+    h.update(json.dumps([list(map(str, X.columns)), list(map(str, X.dtypes))]).encode())
+    h.update(pd.util.hash_pandas_object(X, index=False).values.tobytes())
+    h.update(pd.util.hash_pandas_object(y, index=False).values.tobytes())
+    return h.hexdigest()
+
+
+def _metrics(model, task, X_test, y_test):
+    from sklearn import metrics
+
+    pred = model.predict(X_test)
+    if task == "regression":
+        return {
+            "r2": metrics.r2_score(y_test, pred),
+            "rmse": float(np.sqrt(metrics.mean_squared_error(y_test, pred))),
+            "mae": metrics.mean_absolute_error(y_test, pred),
+        }
+    out = {"accuracy": metrics.accuracy_score(y_test, pred)}
+    classes = sorted(y_test.unique())
+    binary = len(classes) == 2
+    out["f1"] = metrics.f1_score(
+        y_test, pred, average="binary" if binary else "macro", pos_label=classes[-1]
+    )
+    if binary and hasattr(model, "predict_proba"):
+        out["roc_auc"] = metrics.roc_auc_score(
+            y_test, model.predict_proba(X_test)[:, 1]
+        )
+    return out
+
+
+def train_model(
+    df,
+    target,
+    features=None,
+    model="random_forest",
+    task=None,
+    test_size=0.2,
+    seed=42,
+    n_jobs=-1,
+    cache=True,
+    cache_dir=".",
+    max_categories=MAX_CATEGORIES,
+    report=True,
+    **params,
+):
+    """
+    Fits `model` (random_forest, extra_trees, gradient_boosting,
+    logistic_regression) on `df` to predict `target`, using all cores.
+    - `features`: input columns, strings are one-hot encoded. Default: all but
+      target, minus id columns and strings with more than `max_categories` values.
+    - `task`: "classification" / "regression", guessed from the target if None.
+    - `**params` go to the sklearn estimator (n_estimators=300, max_depth=8...).
+    - The fitted model is cached (modelcache_*.joblib in `cache_dir`) by data
+      fingerprint + features + params: the same call again loads it instead.
+    Returns a TrainedModel (.model, .X_train, .X_test, .y_train, .y_test, .metrics).
+    """
+    import joblib
+    import sklearn
+    from sklearn.model_selection import train_test_split
+
+    if model not in MODELS:
+        raise ValueError(f"Unknown model {model!r}, expected one of {sorted(MODELS)}")
+    start = time.perf_counter()
+
+    X, y, used, dropped = _prepare(df, target, features, max_categories)
+    task = task or _infer_task(y)
+    stratify = None
+    if task == "classification" and y.value_counts().min() >= 2:
+        stratify = y
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=test_size, random_state=seed, stratify=stratify
+    )
+    medians = X_train.median(numeric_only=True)
+    X_train, X_test = X_train.fillna(medians), X_test.fillna(medians)
+
+    estimator_cls = _load_class(MODELS[model][task == "regression"])
+    defaults = estimator_cls().get_params()
+    if "random_state" in defaults:
+        params.setdefault("random_state", seed)
+    if "max_iter" in defaults and model == "logistic_regression":
+        params.setdefault("max_iter", 1000)
+
+    # n_jobs does not change the fitted model, so it is not part of the key
+    key = hashlib.sha1(
+        json.dumps(
+            [
+                _fingerprint(X, y),
+                target,
+                model,
+                task,
+                test_size,
+                seed,
+                sorted(params.items()),
+                sklearn.__version__,
+            ],
+            default=str,
+        ).encode()
+    ).hexdigest()[:16]
+    path = os.path.join(cache_dir, f"{MODEL_CACHE_PREFIX}{key}.joblib")
+
+    source = "trained"
+    fitted = _models.get(key) if cache else None
+    if fitted is not None:
+        source = "memory cache"
+    elif cache and os.path.exists(path):
+        fitted = joblib.load(path)
+        source = "disk cache"
+    else:
+        # LogisticRegression's n_jobs only applies to the deprecated OvR path
+        # (FutureWarning on every fit since sklearn 1.8)
+        if "n_jobs" in defaults and model != "logistic_regression":
+            params["n_jobs"] = n_jobs
+        fitted = estimator_cls(**params)
+        if model in SCALED_MODELS:
+            from sklearn.pipeline import make_pipeline
+            from sklearn.preprocessing import StandardScaler
+
+            fitted = make_pipeline(StandardScaler(), fitted)
+        fitted.fit(X_train, y_train)
+        if cache:
+            tmp = path + ".tmp"
+            joblib.dump(fitted, tmp)
+            os.replace(tmp, path)
+    if cache:
+        _models[key] = fitted
+
+    result = TrainedModel(
+        fitted,
+        key,
+        task,
+        used,
+        list(X.columns),
+        (X_train, X_test, y_train, y_test),
+        _metrics(fitted, task, X_test, y_test),
+        time.perf_counter() - start,
+    )
+    if report:
+        scores = ", ".join(f"{k} {v:.3f}" for k, v in result.metrics.items())
+        parallel = source == "trained" and "n_jobs" in params
+        cores = f", {joblib.cpu_count()} cores" if parallel else ""
+        print(
+            f"🌲 {model} ({task}) on {len(X_train):,} rows x {X.shape[1]} columns: "
+            f"{scores} [{source} in {result.seconds:.2f}s{cores}]"
+        )
+        if dropped:
+            print(f"   dropped (ids / too many categories): {', '.join(dropped)}")
+    return result
+
+
+def feature_importance(result, top=20):
+    """Largest first: impurity importance for trees, |coefficient| for linear models."""
+    model = result.model
+    if hasattr(model, "steps"):
+        model = model.steps[-1][1]  # coefficients of the scaled features
+    if hasattr(model, "feature_importances_"):
+        values = model.feature_importances_
+    elif hasattr(model, "coef_"):
+        coef = np.atleast_2d(model.coef_)
+        values = np.abs(coef).mean(axis=0)
+    else:
+        # HistGradientBoosting has neither: use SHAP instead
+        sv = explain_model(result, report=False)
+        values = np.abs(sv.values).mean(axis=0)
+    out = pd.DataFrame({"feature": result.columns, "importance": values})
+    return (
+        out.sort_values("importance", ascending=False).head(top).reset_index(drop=True)
+    )
+
+
+def _make_explainer(result, background, seed):
+    """(kind, explainer, transform): Tree / Linear explainers when they apply."""
+    import shap
+
+    model = result.model
+    bg = result.X_train
+    if len(bg) > background:
+        bg = bg.sample(background, random_state=seed)
+    if (
+        hasattr(model, "feature_importances_")
+        or "GradientBoosting" in type(model).__name__
+    ):
+        return "tree", shap.TreeExplainer(model), None
+    # scaler + linear model: explain the linear step on the scaled inputs
+    last = model.steps[-1][1] if hasattr(model, "steps") else model
+    transform = model[:-1].transform if hasattr(model, "steps") else None
+    if hasattr(last, "coef_"):
+        return "linear", shap.LinearExplainer(last, _scaled(bg, transform)), transform
+    predict = model.predict_proba if hasattr(model, "predict_proba") else model.predict
+    return "permutation", shap.Explainer(predict, bg), None
+
+
+def _scaled(X, transform):
+    if transform is None:
+        return X
+    return pd.DataFrame(transform(X), columns=X.columns, index=X.index)
+
+
+def explain_model(
+    result,
+    X=None,
+    max_samples=200,
+    approximate=False,
+    background=100,
+    class_index=None,
+    seed=0,
+    cache=True,
+    cache_dir=".",
+    report=True,
+):
+    """
+    SHAP values for a TrainedModel, fast on big frames:
+    - explains at most `max_samples` rows of `X` (default: the test split),
+    - tree models use exact TreeSHAP; `approximate=True` gives Saabas
+      attributions instead, hundreds of times faster on deep forests but NOT
+      SHAP values (only for a quick look at many rows),
+    - linear models use LinearExplainer (on the scaled inputs), anything else a
+      permutation explainer on `background` training rows,
+    - the explainer is kept for this kernel and the values cached on disk
+      (shapcache_*.joblib), so the next plot is instant.
+    For binary classifiers the positive class is returned (`class_index` to pick).
+    Returns a shap.Explanation: `shap.plots.beeswarm(sv)`, `shap.plots.bar(sv)`.
+    """
+    import joblib
+
+    start = time.perf_counter()
+    X = result.X_test if X is None else X
+    if len(X) > max_samples:
+        X = X.sample(max_samples, random_state=seed)
+
+    rows = hashlib.sha1(
+        pd.util.hash_pandas_object(X, index=False).values.tobytes()
+    ).hexdigest()[:12]
+    mode = "saabas" if approximate else "exact"
+    key = f"{result.key}_{rows}_{background}_{seed}_{mode}"
+    path = os.path.join(cache_dir, f"{SHAP_CACHE_PREFIX}{key}.joblib")
+
+    source = "computed"
+    if cache and os.path.exists(path):
+        kind, sv = joblib.load(path)
+        source = "cache"
+    else:
+        # the background rows depend on its size and seed, not just the model
+        explainer_key = (result.key, background, seed)
+        entry = _explainers.get(explainer_key)
+        if entry is None:
+            entry = _make_explainer(result, background, seed)
+            _explainers[explainer_key] = entry
+        kind, explainer, transform = entry
+        if kind == "tree":
+            sv = explainer(X, check_additivity=False, approximate=approximate)
+        elif kind == "linear":
+            sv = explainer(_scaled(X, transform))
+            sv.data = X.values  # plots colour points by the original values
+        else:
+            sv = explainer(X, silent=True)
+        if cache:
+            joblib.dump((kind, sv), path)
+
+    if sv.values.ndim == 3:
+        if class_index is None:
+            class_index = 1 if sv.values.shape[2] == 2 else 0
+        sv = sv[:, :, class_index]
+    if report:
+        if kind == "tree" and approximate:
+            what = "Approximate (Saabas) attributions, not SHAP values,"
+        else:
+            what = f"SHAP values ({kind} explainer)"
+        print(
+            f"🔍 {what} for {len(X):,} rows x {X.shape[1]} columns "
+            f"[{source} in {time.perf_counter() - start:.2f}s]"
+        )
+    return sv
@@ -0,0 +1,355 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+import requests
+from flask import Flask, Response, request, jsonify
+import wire
+
+# Session-affinity router in front of N sandbox replicas (server.py).
+# - a chat session is pinned to one replica, so its kernel state survives turns
+# - new sessions go to the least loaded healthy replica (load from /health)
+# - replicas failing health checks are marked down; their sessions move on
+#   (with a notice, the old kernel's variables are gone)
+# - draining replicas keep their sessions but get no new ones
+#
+# The app keeps talking to DOCKER_EXEC_URL (now the router). Local test:
+#   python sandbox/router.py --spawn 3 --base-port 5001 --port 5000
+
+REPLICAS = [
+    u.strip().rstrip("/")
+    for u in os.environ.get("SANDBOX_REPLICAS", "").split(",")
+    if u.strip()
+]
+HEALTH_INTERVAL = float(os.environ.get("ROUTER_HEALTH_INTERVAL", 2))
+FAIL_THRESHOLD = int(os.environ.get("ROUTER_FAIL_THRESHOLD", 2))
+SESSION_TTL = float(os.environ.get("ROUTER_SESSION_TTL", 6 * 3600))
+EXEC_TIMEOUT = 300
+
+KERNEL_MOVED_NOTICE = (
+    "[System]: The sandbox that held this session's Python kernel went down, so "
+    "this code ran on another sandbox. Variables, imports and models from earlier "
+    "turns are not there (files in the workspace are); that kernel is shared with "
+    "other sessions, so re-create what you need instead of relying on existing "
+    "names.\n"
+)
+
+
+class Replica:
+    def __init__(self, url):
+        self.url = url
+        self.healthy = False  # until the first health check answers
+        self.draining = False  # set by the admin API or reported by the replica
+        self.failures = 0
+        self.load = {}
+        self.checked_at = None
+
+    def score(self, pinned):
+        """Lower is better: running requests first, then sessions pinned here."""
+        in_flight = self.load.get("in_flight", 0) + int(bool(self.load.get("busy")))
+        return (in_flight, pinned)
+
+    def to_dict(self, pinned):
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "draining": self.draining,
+            "drained": self.draining and pinned == 0,
+            "sessions": pinned,
+            "load": self.load,
+            "checked_at": self.checked_at,
+        }
+
+
+class Router:
+    def __init__(self, urls):
+        self.replicas = {u: Replica(u) for u in urls}
+        # session -> [replica url, last seen, served]; served = a request of the
+        # session completed there (only then is there kernel state to lose)
+        self.sessions = {}
+        self._lock = threading.Lock()
+
+    # --- placement -------------------------------------------------------
+    def _pinned_counts(self):
+        counts = {u: 0 for u in self.replicas}
+        for url, _, _ in self.sessions.values():
+            if url in counts:
+                counts[url] += 1
+        return counts
+
+    def _pick(self, exclude=()):
+        counts = self._pinned_counts()
+        candidates = [
+            r
+            for r in self.replicas.values()
+            if r.healthy and not r.draining and r.url not in exclude
+        ]
+        if not candidates:
+            # Everything draining: still better than refusing the request
+            candidates = [
+                r for r in self.replicas.values() if r.healthy and r.url not in exclude
+            ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda r: r.score(counts[r.url])).url
+
+    def route(self, session, exclude=()):
+        """(replica url, moved) for a session; moved = the replica that ran its
+        earlier requests is gone."""
+        with self._lock:
+            entry = self.sessions.get(session)
+            if entry is not None:
+                replica = self.replicas.get(entry[0])
+                if replica is not None and replica.healthy and entry[0] not in exclude:
+                    entry[1] = time.time()
+                    return entry[0], False
+            url = self._pick(exclude)
+            if url is None:
+                return None, False
+            self.sessions[session] = [url, time.time(), False]
+            return url, entry is not None and entry[2]
+
+    def mark_served(self, session, url):
+        with self._lock:
+            entry = self.sessions.get(session)
+            if entry is not None and entry[0] == url:
+                entry[2] = True
+
+    def mark_failed(self, url):
+        with self._lock:
+            replica = self.replicas.get(url)
+            if replica is not None:
+                replica.failures = FAIL_THRESHOLD
+                replica.healthy = False
+
+    def set_draining(self, url, draining):
+        with self._lock:
+            if url not in self.replicas:
+                return False
+            self.replicas[url].draining = draining
+            return True
+
+    # --- background health checks -----------------------------------------
+    def check_once(self):
+        for replica in list(self.replicas.values()):
+            try:
+                r = requests.get(replica.url + "/health", timeout=2)
+                r.raise_for_status()
+                load = r.json()
+                ok = True
+            except (requests.RequestException, ValueError):
+                load, ok = {}, False
+            with self._lock:
+                replica.checked_at = time.time()
+                if ok:
+                    replica.failures = 0
+                    replica.healthy = True
+                    replica.load = load
+                    if load.get("status") == "draining":
+                        replica.draining = True
+                else:
+                    replica.failures += 1
+                    if replica.failures >= FAIL_THRESHOLD:
+                        replica.healthy = False
+
+        # Forget sessions that have been idle for a long time
+        now = time.time()
+        with self._lock:
+            for session, (_, seen, _) in list(self.sessions.items()):
+                if now - seen > SESSION_TTL:
+                    del self.sessions[session]
+
+    def start_health_checks(self):
+        def _loop():
+            while True:
+                try:
+                    self.check_once()
+                except Exception as e:
+                    print(f"⚠️ Router health check error: {e}")
+                time.sleep(HEALTH_INTERVAL)
+
+        threading.Thread(target=_loop, name="router-health", daemon=True).start()
+
+    def status(self):
+        with self._lock:
+            counts = self._pinned_counts()
+            return {
+                "replicas": [r.to_dict(counts[u]) for u, r in self.replicas.items()],
+                "sessions": len(self.sessions),
+            }
+
+
+app = Flask(__name__)
+router = Router(REPLICAS)
+
+
+def _session_of(body):
+    # The client sends X-Session-Id; older clients only send the workspace
+    return request.headers.get("X-Session-Id") or body.get("workspace", "")
+
+
+def _add_notice(content, path, content_type):
+    """Adds the kernel-moved notice to the logs the agent will read."""
+    framed = content_type.startswith(wire.CONTENT_TYPE)
+    try:
+        data = wire.decode(content) if framed else json.loads(content)
+    except ValueError:
+        return content
+    if path == "/execute":
+        # appended: the client drops everything printed before its start marker
+        data["logs"] = data.get("logs", "") + "\n" + KERNEL_MOVED_NOTICE
+    elif data.get("cells"):
+        data["cells"][0]["logs"] = KERNEL_MOVED_NOTICE + data["cells"][0].get(
+            "logs", ""
+        )
+    if framed:
+        return wire.encode(data, wire.negotiate(request.headers) or "raw")
+    return json.dumps(data)
+
+
+def _error(message, status):
+    # Same shape as a sandbox answer, so the client shows it as a tool error
+    return jsonify({"logs": "", "images": [], "error": message}), status
+
+
+def _forward(path):
+    body = request.get_json(silent=True) or {}
+    session = _session_of(body)
+    tried = []
+    # One retry on another replica if we could not even connect to the first
+    for _ in range(2):
+        url, moved = router.route(session, exclude=tried)
+        if url is None:
+            return _error("No healthy sandbox", 503)
+        try:
+            # Accept / codecs go through: framed responses are passed on as-is
+            headers = {
+                k: v
+                for k, v in request.headers.items()
+                if k in ("Accept", wire.CODECS_HEADER)
+            }
+            resp = requests.post(
+                url + path, json=body, headers=headers, timeout=EXEC_TIMEOUT
+            )
+        except requests.ConnectionError:
+            router.mark_failed(url)
+            tried.append(url)
+            continue
+        except requests.Timeout:
+            # Not retried: the code may still be running there
+            return _error(f"Sandbox did not answer within {EXEC_TIMEOUT}s", 504)
+        except requests.RequestException as e:
+            return _error(f"Sandbox request failed: {e}", 502)
+        router.mark_served(session, url)
+        content = resp.content
+        content_type = resp.headers.get("Content-Type", "application/json")
+        if moved:
+            content = _add_notice(content, path, content_type)
+        return Response(
+            content,
+            status=resp.status_code,
+            content_type=content_type,
+            headers={"X-Sandbox-Replica": url},
+        )
+    return _error("No healthy sandbox", 503)
+
+
+@app.route("/execute", methods=["POST"])
+def execute_endpoint():
+    return _forward("/execute")
+
+
+@app.route("/execute_batch", methods=["POST"])
+def execute_batch_endpoint():
+    return _forward("/execute_batch")
+
+
+@app.route("/restart", methods=["POST"])
+def restart_endpoint():
+    """Restarts only the kernel of the calling session's replica."""
+    body = request.get_json(silent=True) or {}
+    session = _session_of(body)
+    with router._lock:
+        entry = router.sessions.get(session)
+    if entry is None:
+        return jsonify(
+            {"status": "success", "message": "No kernel for this session yet."}
+        )
+    try:
+        resp = requests.post(entry[0] + "/restart", timeout=30)
+        return Response(
+            resp.content, status=resp.status_code, content_type="application/json"
+        )
+    except requests.RequestException as e:
+        return jsonify({"status": "error", "message": str(e)}), 502
+
+
+@app.route("/health", methods=["GET"])
+def health_endpoint():
+    status = router.status()
+    healthy = sum(r["healthy"] for r in status["replicas"])
+    status["status"] = "ok" if healthy else "down"
+    return jsonify(status), 200 if healthy else 503
+
+
+@app.route("/admin/drain", methods=["POST"])
+def drain_endpoint():
+    """{"replica": url, "draining": true}: no new sessions; existing ones stay."""
+    body = request.get_json(silent=True) or {}
+    url = (body.get("replica") or "").rstrip("/")
+    draining = bool(body.get("draining", True))
+    if not router.set_draining(url, draining):
+        return jsonify({"status": "error", "message": f"Unknown replica {url}"}), 404
+    # Tell the replica too, so a restarted router still sees it
+    try:
+        requests.post(url + "/drain", json={"draining": draining}, timeout=2)
+    except requests.RequestException:
+        pass
+    return jsonify(router.status())
+
+
+def spawn_replicas(count, base_port):
+    """Starts `count` local server.py processes (ports base_port, base_port+1...)."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    procs, urls = [], []
+    for i in range(count):
+        port = base_port + i
+        env = dict(os.environ, SANDBOX_PORT=str(port))
+        procs.append(
+            subprocess.Popen([sys.executable, os.path.join(here, "server.py")], env=env)
+        )
+        urls.append(f"http://127.0.0.1:{port}")
+    return procs, urls
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sandbox session router")
+    parser.add_argument(
+        "--port", type=int, default=int(os.environ.get("ROUTER_PORT", 5000))
+    )
+    parser.add_argument("--replicas", default=None, help="comma-separated replica URLs")
+    parser.add_argument("--spawn", type=int, default=0, help="start N local replicas")
+    parser.add_argument("--base-port", type=int, default=5001)
+    args = parser.parse_args()
+
+    procs = []
+    if args.replicas:
+        router = Router([u.strip().rstrip("/") for u in args.replicas.split(",")])
+    if args.spawn:
+        procs, urls = spawn_replicas(args.spawn, args.base_port)
+        router = Router(list(router.replicas) + urls)
+    if not router.replicas:
+        parser.error("no replicas: set SANDBOX_REPLICAS, --replicas or --spawn")
+
+    router.start_health_checks()
+    print(
+        f"🔀 Routing to {len(router.replicas)} sandbox replica(s): {', '.join(router.replicas)}"
+    )
+    try:
+        app.run(host="0.0.0.0", port=args.port, threaded=True)
+    finally:
+        for p in procs:
+            p.terminate()
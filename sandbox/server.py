@@ -1,102 +1,167 @@
 import os
-import queue
-import base64
 import time
-from flask import Flask, request, jsonify
-import jupyter_client
-from subprocess import PIPE
+import threading
+from flask import Flask, Response, request, jsonify
+from kernel_engine import KernelEngine
+import wire
 
 app = Flask(__name__)
 
+# Workspace root inside the container (host ./workspace is mounted here)
+WORK_ROOT = os.environ.get("SANDBOX_WORKDIR", "/app/workspace")
 
-class DockerKernel:
-    def __init__(self, work_dir="/app/workspace"):
-        self.work_dir = work_dir
-        if not os.path.exists(self.work_dir):
-            os.makedirs(self.work_dir)
+# Per-cell limit, a bit under the client's 300s HTTP timeout
+EXEC_TIMEOUT = int(os.environ.get("SANDBOX_EXEC_TIMEOUT", 280))
 
-        self.start()
+
+# Helper libraries (datakit.py, ...) live next to this file and are imported
+# into every fresh kernel, so the agent can call them without imports.
+# Output parsing / image saving is shared with kernel.py (see kernel_engine.py).
+HELPERS_DIR = os.path.dirname(os.path.abspath(__file__))
+PRELOAD_CODE = (
+    "import sys\n"
+    f"sys.path.insert(0, {HELPERS_DIR!r})\n"
+    "from datakit import load_csv, load_sql, read_sql_fast, optimize_dtypes, memory_report\n"
+    "from modelkit import train_model, explain_model, feature_importance\n"
+)
+
+
+def resolve_workspace(rel_path):
+    """Maps a session workspace ('sessions/<id>') to a folder under WORK_ROOT."""
+    root = os.path.realpath(WORK_ROOT)
+    path = os.path.realpath(os.path.join(root, rel_path or ""))
+    if path != root and not path.startswith(root + os.sep):
+        raise ValueError(f"Workspace outside of {WORK_ROOT}: {rel_path}")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class DockerKernel(KernelEngine):
+    def __init__(self, work_dir=WORK_ROOT):
+        super().__init__(work_dir, preload_code=PRELOAD_CODE)
 
     def start(self):
-        """Initializes the kernel."""
-        self.kernel_manager = jupyter_client.KernelManager(kernel_name="python3")
-        self.kernel_manager.start_kernel(stdout=PIPE, stderr=PIPE)
-        self.kernel = self.kernel_manager.blocking_client()
-        self.kernel.start_channels()
-        self.kernel.wait_for_ready(timeout=10)
+        """Initializes the kernel and imports the helper libraries."""
+        super().start()
         print(f"--- Kernel Ready in {self.work_dir} ---")
 
     def shutdown(self):
         """Kills the current kernel."""
         try:
-            self.kernel_manager.shutdown_kernel(now=True)
+            super().shutdown()
         except Exception as e:
             print(f"Error shutting down: {e}")
 
     def restart(self):
         """Restarts the kernel."""
         print("--- Restarting Kernel ---")
-        self.shutdown()
-        self.start()
+        super().restart()
         return "Kernel Restarted"
 
-    def execute(self, code):
-        # ... (This part remains exactly the same as your old code) ...
-        self.kernel.execute(code)
-        msg_list = []
-        start_time = time.time()
-
-        while True:
-            try:
-                iopub_msg = self.kernel.get_iopub_msg(timeout=5)
-                msg_list.append(iopub_msg)
-                if (
-                    iopub_msg["msg_type"] == "status"
-                    and iopub_msg["content"].get("execution_state") == "idle"
-                ):
-                    break
-            except queue.Empty:
-                if time.time() - start_time > 10:
-                    break
-                continue
-
-        logs = []
-        images = []
-
-        for msg in msg_list:
-            content = msg["content"]
-            msg_type = msg["msg_type"]
-
-            if msg_type == "stream":
-                logs.append(content["text"])
-            elif msg_type in ("execute_result", "display_data"):
-                data = content.get("data", {})
-                if "text/plain" in data:
-                    logs.append(data["text/plain"])
-
-                # Handle Images
-                for mime in ["image/png", "image/jpeg"]:
-                    if mime in data:
-                        ext = "png" if "png" in mime else "jpg"
-                        filename = f"{int(time.time() * 1000)}.{ext}"
-                        filepath = os.path.join(self.work_dir, filename)
-                        with open(filepath, "wb") as f:
-                            f.write(base64.b64decode(data[mime]))
-                        images.append(filename)
-            elif msg_type == "error":
-                logs.append(f"Error: {chr(10).join(content['traceback'])}")
-
-        return {"logs": "".join(logs), "images": images}
-
 
 # Initialize Global Kernel
 kernel = DockerKernel()
 
+# Load reported on /health (the router in router.py places new sessions by it)
+EXEC_PATHS = ("/execute", "/execute_batch")
+SESSION_ACTIVE_SECONDS = 3600
+_load_lock = threading.Lock()
+_in_flight = 0
+_recent_sessions = {}  # workspace -> last request time
+_draining = False
+_started_at = time.time()
+
+
+@app.before_request
+def _track_start():
+    global _in_flight
+    if request.path in EXEC_PATHS:
+        body = request.get_json(silent=True) or {}
+        with _load_lock:
+            _in_flight += 1
+            _recent_sessions[body.get("workspace", "")] = time.time()
+
+
+@app.teardown_request
+def _track_end(exc=None):
+    global _in_flight
+    if request.path in EXEC_PATHS:
+        with _load_lock:
+            _in_flight -= 1
+
+
+@app.route("/health", methods=["GET"])
+def health_endpoint():
+    now = time.time()
+    with _load_lock:
+        for ws, seen in list(_recent_sessions.items()):
+            if now - seen > SESSION_ACTIVE_SECONDS:
+                del _recent_sessions[ws]
+        sessions = len(_recent_sessions)
+        in_flight = _in_flight
+    return jsonify(
+        {
+            "status": "draining" if _draining else "ok",
+            "in_flight": in_flight,
+            "busy": kernel._lock.locked(),
+            "sessions": sessions,
+            "loadavg": os.getloadavg()[0] if hasattr(os, "getloadavg") else None,
+            "uptime": round(now - _started_at, 1),
+        }
+    )
+
+
+@app.route("/drain", methods=["POST"])
+def drain_endpoint():
+    """{"draining": true|false}: tells the router to stop sending new sessions here."""
+    global _draining
+    _draining = bool((request.get_json(silent=True) or {}).get("draining", True))
+    return jsonify({"status": "draining" if _draining else "ok"})
+
+
+def respond(result):
+    """Framed + compressed if the client asked for it (see wire.py), else JSON."""
+    codec = wire.negotiate(request.headers)
+    if codec is None:
+        return jsonify(result)
+    return Response(wire.encode(result, codec), mimetype=wire.CONTENT_TYPE)
+
 
 @app.route("/execute", methods=["POST"])
 def execute_endpoint():
     code = request.json.get("code", "")
-    return jsonify(kernel.execute(code))
+    try:
+        work_dir = resolve_workspace(request.json.get("workspace", ""))
+    except ValueError as e:
+        return jsonify({"logs": "", "images": [], "error": str(e)}), 400
+    return respond(kernel.execute(code, work_dir, timeout=EXEC_TIMEOUT))
+
+
+@app.route("/execute_batch", methods=["POST"])
+def execute_batch_endpoint():
+    """Several cells in one request: {"cells": [...], "stop_on_error": true, "setup": ""}"""
+    body = request.json or {}
+    cells = body.get("cells")
+    if not isinstance(cells, list) or not all(isinstance(c, str) for c in cells):
+        return (
+            jsonify(
+                {"cells": [], "images": [], "error": "cells must be a list of strings"}
+            ),
+            400,
+        )
+    try:
+        work_dir = resolve_workspace(body.get("workspace", ""))
+    except ValueError as e:
+        return jsonify({"cells": [], "images": [], "error": str(e)}), 400
+    return respond(
+        kernel.execute_batch(
+            cells,
+            work_dir,
+            stop_on_error=bool(body.get("stop_on_error", True)),
+            setup=body.get("setup", ""),
+            timeout=EXEC_TIMEOUT,
+        )
+    )
 
 
 # --- NEW: RESTART ENDPOINT ---
@@ -110,4 +175,4 @@ def restart_endpoint():
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000)
+    app.run(host="0.0.0.0", port=int(os.environ.get("SANDBOX_PORT", 5000)))
@@ -0,0 +1,130 @@
+import gzip
+import json
+import struct
+
+try:
+    import zstandard
+except ImportError:  # gzip only
+    zstandard = None
+
+# Compact response format for /execute and /execute_batch, used when the client
+# asks for it (Accept: application/x-sandbox-frames). Plain JSON otherwise.
+#
+#   b"SBF1" then frames: <u8 codec> <u32 length> <payload>
+#   frame 0 is the result as JSON, with every big "logs"/"error" string replaced
+#   by {"$frame": n}; frame n holds that string (utf-8).
+#
+# Each frame is compressed on its own (zstd if both sides have it, else gzip),
+# small ones are sent raw. Shared by server.py, router.py and the app client,
+# so no imports from the rest of the sandbox here.
+
+CONTENT_TYPE = "application/x-sandbox-frames"
+CODECS_HEADER = "X-Sandbox-Codecs"
+MAGIC = b"SBF1"
+
+RAW, GZIP, ZSTD = 0, 1, 2
+# strings shorter than this stay inline in the JSON frame
+FRAME_MIN_CHARS = 2048
+# frames shorter than this are not worth compressing
+COMPRESS_MIN_BYTES = 512
+FRAMED_KEYS = ("logs", "error")
+
+_HEADER = struct.Struct("!BI")
+
+
+def available_codecs():
+    return ["zstd", "gzip"] if zstandard is not None else ["gzip"]
+
+
+def request_headers():
+    """Headers a client sends to get frames back."""
+    return {
+        "Accept": f"{CONTENT_TYPE}, application/json",
+        CODECS_HEADER: ",".join(available_codecs()),
+    }
+
+
+def negotiate(headers):
+    """The codec to answer with (None = the client wants plain JSON)."""
+    if CONTENT_TYPE not in headers.get("Accept", ""):
+        return None
+    offered = [c.strip() for c in headers.get(CODECS_HEADER, "gzip").split(",")]
+    for codec in available_codecs():
+        if codec in offered:
+            return codec
+    return "raw"
+
+
+def _compress(data, codec):
+    if codec == "raw" or len(data) < COMPRESS_MIN_BYTES:
+        return RAW, data
+    if codec == "zstd":
+        return ZSTD, zstandard.ZstdCompressor(level=3).compress(data)
+    return GZIP, gzip.compress(data, compresslevel=5)
+
+
+def _decompress(codec_id, data):
+    if codec_id == RAW:
+        return data
+    if codec_id == GZIP:
+        return gzip.decompress(data)
+    if codec_id == ZSTD:
+        if zstandard is None:
+            raise ValueError("zstd frame but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Unknown frame codec {codec_id}")
+
+
+def encode(result, codec="gzip"):
+    """Result dict -> framed bytes."""
+    payloads = []
+
+    def _pull(obj):
+        if isinstance(obj, dict):
+            out = {}
+            for k, v in obj.items():
+                if (
+                    k in FRAMED_KEYS
+                    and isinstance(v, str)
+                    and len(v) >= FRAME_MIN_CHARS
+                ):
+                    payloads.append(v.encode("utf-8"))
+                    out[k] = {"$frame": len(payloads)}
+                else:
+                    out[k] = _pull(v)
+            return out
+        if isinstance(obj, list):
+            return [_pull(v) for v in obj]
+        return obj
+
+    meta = json.dumps(_pull(result)).encode("utf-8")
+    parts = [MAGIC]
+    for data in [meta] + payloads:
+        codec_id, body = _compress(data, codec)
+        parts.append(_HEADER.pack(codec_id, len(body)))
+        parts.append(body)
+    return b"".join(parts)
+
+
+def decode(data):
+    """Framed bytes -> result dict."""
+    if data[: len(MAGIC)] != MAGIC:
+        raise ValueError("Not a sandbox frames payload")
+    frames = []
+    pos = len(MAGIC)
+    while pos < len(data):
+        codec_id, length = _HEADER.unpack_from(data, pos)
+        pos += _HEADER.size
+        frames.append(_decompress(codec_id, data[pos : pos + length]))
+        pos += length
+
+    def _fill(obj):
+        if isinstance(obj, dict):
+            if set(obj) == {"$frame"}:
+                return frames[obj["$frame"]].decode("utf-8")
+            return {k: _fill(v) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [_fill(v) for v in obj]
+        return obj
+
+    return _fill(json.loads(frames[0]))
@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import profiling  # noqa: E402
+
+
+def test_streaming_report_through_submit_profile(tmp_path, monkeypatch):
+    # Anything counts as "big", several chunks, and a real process pool
+    # started from inside the job process
+    monkeypatch.setenv("PROFILE_STREAMING_THRESHOLD", "1")
+    monkeypatch.setenv("PROFILE_CHUNK_ROWS", "500")
+    monkeypatch.setenv("PROFILE_WORKERS", "2")
+    monkeypatch.setattr(profiling, "REPORTS_DIR", str(tmp_path / "reports"))
+
+    rng = np.random.default_rng(0)
+    csv_path = tmp_path / "big.csv"
+    pd.DataFrame(
+        {
+            "balance": rng.normal(1000, 250, 3000),
+            "age": rng.integers(18, 90, 3000),
+            "country": rng.choice(["France", "Spain", "Germany"], 3000),
+        }
+    ).to_csv(csv_path, index=False)
+
+    job = profiling.submit_profile(str(csv_path))
+    deadline = time.time() + 120
+    while job.status == "running" and time.time() < deadline:
+        time.sleep(0.2)
+
+    assert job.status == "done"
+    with open(job.report_path, encoding="utf-8") as f:
+        html = f.read()
+    for column in ("balance", "age", "country"):
+        assert column in html
+
+    # Priming reuses the job's pass instead of reading the file again
+    summary = job.summary()
+    assert summary.startswith("DATASET SHAPE: (3000, 3)")
+
+
+def test_topk_counts_are_lower_bounds_after_merge():
+    from collections import Counter
+
+    from profile_engine import TopK
+
+    rng = np.random.default_rng(1)
+    values = rng.zipf(1.5, 20000) % 200
+    parts = [TopK(capacity=16) for _ in range(3)]
+    for i, chunk in enumerate(np.array_split(values, 12)):
+        parts[i % 3].add_counts(Counter(chunk.tolist()))
+    topk = parts[0]
+    topk.merge(parts[1])
+    topk.merge(parts[2])
+
+    true = Counter(values.tolist())
+    assert topk.n == len(values) and len(topk.counts) <= 16
+    for value, c in topk.top(5):
+        assert true[value] - topk.error <= c <= true[value]
+    assert topk.format_count(topk.top(1)[0][1]).startswith("≥")
@@ -0,0 +1,63 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tool_batches import ToolBatches  # noqa: E402
+
+
+def _updates(call_ids):
+    # What the agent streams: one "tools" update per finished call
+    for call_id in call_ids:
+        yield {"tools": {"messages": [{"tool_call_id": call_id}]}}
+
+
+def _feed(batches, updates):
+    shown, timings = [], []
+    for update in updates:
+        for values in update.values():
+            for msg in values["messages"]:
+                ready, finished = batches.add(msg["tool_call_id"], msg["tool_call_id"])
+                shown.extend(ready)
+                if finished and len(finished) > 1:
+                    timings.append(finished)
+    return shown, timings
+
+
+def test_single_result_updates_are_shown_in_call_order():
+    batches = ToolBatches()
+    batches.start("ai_1", ["a", "b", "c"])
+
+    shown, timings = _feed(batches, _updates(["c", "a", "b"]))
+
+    assert shown == ["a", "b", "c"]
+    # reported once, when the last call of the batch came back
+    assert timings == [["a", "b", "c"]]
+
+
+def test_results_are_released_as_soon_as_earlier_calls_returned():
+    batches = ToolBatches()
+    batches.start("ai_1", ["a", "b"])
+
+    assert batches.add("a", "a") == (["a"], None)
+    assert batches.add("b", "b") == (["b"], ["a", "b"])
+
+
+def test_batches_of_different_messages_and_unknown_calls():
+    batches = ToolBatches()
+    batches.start("ai_1", ["a"])
+    batches.start("ai_2", ["b", "c"])
+
+    shown, timings = _feed(batches, _updates(["x", "a", "c", "b"]))
+
+    assert shown == ["x", "a", "b", "c"]
+    assert timings == [["b", "c"]]
+
+
+def test_drain_returns_results_stuck_behind_a_missing_call():
+    batches = ToolBatches()
+    batches.start("ai_1", ["a", "b", "c"])
+
+    assert batches.add("c", "c") == ([], None)
+    assert batches.drain() == ["c"]
+    assert batches.drain() == []
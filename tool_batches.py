@@ -0,0 +1,54 @@
+# Groups the tool results of a turn by the AI message that asked for them.
+# The agent runs each tool call as its own task (LangGraph Send), so every
+# ToolMessage arrives in a separate "tools" update, in the order the tools
+# finish. Results are handed back in the order the model wrote the calls,
+# and a batch is reported once all of its calls have returned.
+
+
+class ToolBatches:
+    def __init__(self):
+        # batch id -> {"calls": [ids in order], "results": {id: item}, "next": index}
+        self._batches = {}
+        self._batch_of = {}  # tool_call_id -> batch id
+
+    def start(self, batch_id, call_ids):
+        """Registers the tool calls of one AI message, in the order they were written."""
+        self._batches[batch_id] = {"calls": list(call_ids), "results": {}, "next": 0}
+        for call_id in call_ids:
+            self._batch_of[call_id] = batch_id
+
+    def add(self, call_id, item):
+        """
+        Records the result of one call. Returns (ready, finished):
+        - ready: results that can be shown now, in call order (every earlier
+          call of the batch has returned),
+        - finished: all results of the batch in call order once its last call
+          has returned, else None.
+        A call that belongs to no known batch is ready right away.
+        """
+        batch_id = self._batch_of.pop(call_id, None)
+        if batch_id is None:
+            return [item], None
+        batch = self._batches[batch_id]
+        batch["results"][call_id] = item
+
+        calls, results = batch["calls"], batch["results"]
+        ready = []
+        while batch["next"] < len(calls) and calls[batch["next"]] in results:
+            ready.append(results[calls[batch["next"]]])
+            batch["next"] += 1
+
+        if batch["next"] < len(calls):
+            return ready, None
+        del self._batches[batch_id]
+        return ready, [results[c] for c in calls]
+
+    def drain(self):
+        """Results still held back (a call never returned), in call order."""
+        left = []
+        for batch in self._batches.values():
+            pending = batch["calls"][batch["next"] :]
+            left.extend(batch["results"][c] for c in pending if c in batch["results"])
+        self._batches.clear()
+        self._batch_of.clear()
+        return left
@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import uuid
+import threading
+import contextvars
+from config import TRACE_ENABLED, TRACE_FILE
+
+# Tracing is process-wide. When disabled, span() hands back one shared no-op
+# object, so instrumented code only pays for a function call and a bool check.
+_enabled = TRACE_ENABLED
+
+_current_turn = contextvars.ContextVar("trace_turn", default=None)
+_current_span = contextvars.ContextVar("trace_span", default=None)
+_write_lock = threading.Lock()
+
+
+def is_enabled():
+    return _enabled
+
+
+def set_enabled(flag):
+    global _enabled
+    _enabled = bool(flag)
+
+
+class _NoopSpan:
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """One timed step. Attributes hold token counts, payload sizes, cache hits..."""
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = dict(attrs)
+        self.span_id = uuid.uuid4().hex[:12]
+        self.turn = _current_turn.get()
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent else None
+        self.start = None
+        self.duration = None
+        self._token = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self._t0
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        _record(self)
+        return False
+
+    def to_dict(self):
+        return {
+            "turn_id": self.turn.turn_id if self.turn else None,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3),
+            "thread": threading.current_thread().name,
+            "attrs": self.attrs,
+        }
+
+
+class Turn:
+    """Collects the spans of one chat turn (across the tool threads too)."""
+
+    def __init__(self, label=""):
+        self.turn_id = uuid.uuid4().hex[:12]
+        self.label = label
+        self.spans = []
+        self._lock = threading.Lock()
+        self._token = None
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def __enter__(self):
+        self._token = _current_turn.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        _current_turn.reset(self._token)
+        return False
+
+    def breakdown(self):
+        """Per-component rows: calls, total/max ms and summed attributes."""
+        rows = {}
+        for s in self.spans:
+            row = rows.setdefault(
+                s.name, {"component": s.name, "calls": 0, "total_ms": 0.0, "max_ms": 0.0}
+            )
+            ms = s.duration * 1000
+            row["calls"] += 1
+            row["total_ms"] += ms
+            row["max_ms"] = max(row["max_ms"], ms)
+            for key in ("input_tokens", "output_tokens", "bytes_in", "bytes_out"):
+                if isinstance(s.attrs.get(key), (int, float)):
+                    row[key] = row.get(key, 0) + s.attrs[key]
+            if "cache_hit" in s.attrs:
+                row["cache_hits"] = row.get("cache_hits", 0) + int(bool(s.attrs["cache_hit"]))
+        out = sorted(rows.values(), key=lambda r: r["total_ms"], reverse=True)
+        for r in out:
+            r["total_ms"] = round(r["total_ms"], 1)
+            r["max_ms"] = round(r["max_ms"], 1)
+        return out
+
+
+def span(name, **attrs):
+    """Usage: `with span("sandbox.execute", bytes_out=n) as s: ... s.set(images=2)`"""
+    if not _enabled:
+        return NOOP_SPAN
+    return Span(name, attrs)
+
+
+def start_turn(label=""):
+    """Returns a Turn context; spans opened inside it (any thread) belong to it."""
+    return Turn(label)
+
+
+def _record(s):
+    if s.turn is not None:
+        s.turn.add(s)
+    line = json.dumps(s.to_dict(), default=str)
+    with _write_lock:
+        folder = os.path.dirname(TRACE_FILE)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        with open(TRACE_FILE, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
@@ -1,18 +1,25 @@
 import re
 import os
 import io
+import hashlib
+from functools import lru_cache
 import streamlit as st
-from config import WORKSPACE_DIR
+from config import WORKSPACE_DIR, THUMBS_DIR, THUMB_MAX_SIZE
+
+IMAGE_TAG_RE = re.compile(r"\[IMAGE_GENERATED:(.*?)\]")
+ANSI_ESCAPE = re.compile(r"\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])")
 
 
 def strip_ansi_codes(text):
-    """Removes ANSI escape sequences from logs."""
-    ansi_escape = re.compile(r"\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])")
-    return ansi_escape.sub("", text)
+    """Removes ANSI escape sequences (sandbox logs already come without them)."""
+    return ANSI_ESCAPE.sub("", text)
 
 
-def render_images_in_grid(image_paths):
-    """Renders a grid of images in Streamlit."""
+def render_images_in_grid(image_paths, key=None):
+    """
+    Renders a grid of thumbnails in Streamlit. The full-size image is only
+    sent to the browser when the user asks for it (needs a unique `key`).
+    """
     if not image_paths:
         return
 
@@ -20,13 +27,71 @@ def render_images_in_grid(image_paths):
     cols = st.columns(num_cols)
 
     for i, img_path in enumerate(image_paths):
-        if os.path.exists(img_path):
-            with cols[i % num_cols]:
-                st.image(
-                    img_path,
-                    caption=os.path.basename(img_path),
-                    use_container_width=True,
-                )
+        thumb = get_thumbnail(img_path)
+        if thumb is None:
+            continue
+        with cols[i % num_cols]:
+            st.image(
+                thumb,
+                caption=os.path.basename(img_path),
+                use_container_width=True,
+            )
+            if key is None:
+                continue
+            state_key = f"fullres_{key}_{i}"
+            if st.session_state.get(state_key):
+                st.image(img_path, use_container_width=True)
+            elif st.button("🔍 Full size", key=f"btn_{state_key}"):
+                st.session_state[state_key] = True
+                st.rerun()
+
+
+@lru_cache(maxsize=1024)
+def _file_digest(path, mtime_ns, size):
+    # (mtime, size) is part of the cache key, so a rewritten file is hashed again
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def get_thumbnail(img_path):
+    """
+    Returns the path of a downscaled, compressed copy of `img_path`,
+    cached on disk by file content hash. None if the image is gone.
+    """
+    try:
+        st_ = os.stat(img_path)
+    except OSError:
+        return None
+
+    digest = _file_digest(img_path, st_.st_mtime_ns, st_.st_size)
+    thumb_path = os.path.join(THUMBS_DIR, f"{digest}.jpg")
+    if os.path.exists(thumb_path):
+        return thumb_path
+
+    if img_path.lower().endswith(".svg"):
+        return img_path  # vector images are already small
+
+    from PIL import Image
+
+    os.makedirs(THUMBS_DIR, exist_ok=True)
+    try:
+        with Image.open(img_path) as im:
+            im.thumbnail((THUMB_MAX_SIZE, THUMB_MAX_SIZE))
+            # JPEG has no alpha: flatten transparent plots onto white
+            if im.mode in ("RGBA", "LA", "P"):
+                im = im.convert("RGBA")
+                bg = Image.new("RGB", im.size, (255, 255, 255))
+                bg.paste(im, mask=im.split()[-1])
+                im = bg
+            tmp_path = f"{thumb_path}.{os.getpid()}.tmp"
+            im.convert("RGB").save(tmp_path, "JPEG", quality=75, optimize=True)
+            os.replace(tmp_path, thumb_path)
+    except Exception:
+        return img_path  # not something PIL can read -> show as is
+    return thumb_path
 
 
 def get_llm_friendly_summary(df):
@@ -42,26 +107,67 @@ def get_llm_friendly_summary(df):
     return summary
 
 
-def save_uploaded_file(uploaded_file):
-    """Saves a Streamlit uploaded file to the workspace."""
-    file_path = os.path.join(WORKSPACE_DIR, uploaded_file.name)
+def summarize_data_file(path, profile_job=None):
+    """
+    LLM summary of a CSV/Parquet file. Big files are never read here: the
+    summary comes from the background profiling job's pass over the file
+    (`profile_job`), or from the first rows if that job has none.
+    """
+    from profile_engine import iter_chunks, should_stream
+
+    if should_stream(path):
+        summary = profile_job.summary() if profile_job is not None else None
+        if summary:
+            return summary
+        head = next(iter_chunks(path, chunksize=1000), None)
+        if head is None:
+            return "EMPTY FILE\n"
+        size_mb = os.path.getsize(path) / 1e6
+        return (
+            f"NOTE: {size_mb:,.0f} MB file, no full profile available: "
+            f"only the first {len(head)} rows were read.\n"
+        ) + get_llm_friendly_summary(head)
+
+    import pandas as pd
+
+    if path.lower().endswith((".parquet", ".pq")):
+        return get_llm_friendly_summary(pd.read_parquet(path))
+    return get_llm_friendly_summary(pd.read_csv(path))
+
+
+def save_uploaded_file(uploaded_file, folder=None):
+    """Saves a Streamlit uploaded file (default: the shared workspace root)."""
+    folder = folder or WORKSPACE_DIR
+    os.makedirs(folder, exist_ok=True)
+    file_path = os.path.join(folder, uploaded_file.name)
     with open(file_path, "wb") as f:
         f.write(uploaded_file.getbuffer())
     return file_path, uploaded_file.name
 
 
-def extract_image_from_response(text):
+def extract_image_from_response(text, workspace_dir=WORKSPACE_DIR):
     """Extracts image paths tagged in the agent response."""
     images = []
-    match = re.search(r"\[IMAGE_GENERATED:(.*?)\]", text)
-    if match:
-        images.extend([img.strip() for img in match.group(1).split(", ")])
+    for group in IMAGE_TAG_RE.findall(text):
+        images.extend([img.strip() for img in group.split(", ")])
 
-    unique_images = list(set(images))
+    unique_images = list(dict.fromkeys(images))
     valid_paths = []
     for img_name in unique_images:
-        full_path = os.path.join(WORKSPACE_DIR, img_name)
+        full_path = os.path.join(workspace_dir, img_name)
         if os.path.exists(full_path):
             valid_paths.append(full_path)
 
     return valid_paths
+
+
+def ensure_parsed(msg, workspace_dir=WORKSPACE_DIR):
+    """
+    Parses a chat history entry once: strips the image tags and resolves the
+    image paths. The result is stored on the message for later reruns.
+    """
+    if "clean" not in msg:
+        content = msg.get("content") or ""
+        msg["images"] = extract_image_from_response(content, workspace_dir)
+        msg["clean"] = IMAGE_TAG_RE.sub("", content)
+    return msg
@@ -0,0 +1,181 @@
+import os
+import time
+import shutil
+import threading
+from config import (
+    SESSIONS_DIR,
+    SANDBOX_WORKSPACE_DIR,
+    WORKSPACE_QUOTA_BYTES,
+    SESSION_TTL_SECONDS,
+    WORKSPACE_GC_INTERVAL,
+    REPORTS_DIR,
+    THUMBS_DIR,
+    CACHE_TTL_SECONDS,
+    CACHE_MAX_BYTES,
+)
+
+# Bookkeeping files inside each session workspace (never evicted)
+HEARTBEAT_FILE = ".last_seen"
+PINNED_FILE = ".pinned"
+
+_gc_thread = None
+_gc_lock = threading.Lock()
+
+
+def session_dir(session_id):
+    """Host path of a session's workspace (created on first use)."""
+    path = os.path.join(SESSIONS_DIR, session_id)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def sandbox_dir(session_id):
+    """The same folder as seen from inside the sandbox container."""
+    return f"{SANDBOX_WORKSPACE_DIR}/sessions/{session_id}"
+
+
+def sandbox_relpath(session_id):
+    """Path relative to the sandbox's workspace root (sent with each execution)."""
+    return f"sessions/{session_id}"
+
+
+def touch(session_id):
+    """Marks the session as alive for the garbage collector."""
+    path = os.path.join(session_dir(session_id), HEARTBEAT_FILE)
+    with open(path, "a"):
+        os.utime(path, None)
+
+
+def pin(session_id, file_name):
+    """Keeps a file (e.g. an uploaded dataset) out of LRU eviction."""
+    with open(os.path.join(session_dir(session_id), PINNED_FILE), "a", encoding="utf-8") as f:
+        f.write(file_name + "\n")
+
+
+def _pinned(path):
+    try:
+        with open(os.path.join(path, PINNED_FILE), encoding="utf-8") as f:
+            return {line.strip() for line in f if line.strip()}
+    except OSError:
+        return set()
+
+
+def _artifacts(path):
+    """(name, size, last_used) of every regular, non-bookkeeping file."""
+    out = []
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.name.startswith(".") or not entry.is_file():
+                continue
+            st_ = entry.stat()
+            out.append((entry.name, st_.st_size, max(st_.st_atime, st_.st_mtime)))
+    return out
+
+
+def usage(session_id):
+    return sum(size for _, size, _ in _artifacts(session_dir(session_id)))
+
+
+def enforce_quota(session_id, quota=WORKSPACE_QUOTA_BYTES):
+    """Deletes least-recently-used artifacts until the workspace fits its quota."""
+    path = session_dir(session_id)
+    files = _artifacts(path)
+    total = sum(size for _, size, _ in files)
+    if total <= quota:
+        return []
+
+    pinned = _pinned(path)
+    evicted = []
+    for name, size, _ in sorted(files, key=lambda f: f[2]):
+        if total <= quota:
+            break
+        if name in pinned:
+            continue
+        try:
+            os.unlink(os.path.join(path, name))
+            total -= size
+            evicted.append(name)
+        except OSError:
+            continue
+    return evicted
+
+
+def clear(session_id):
+    """Deletes this session's files only (other sessions are untouched)."""
+    path = session_dir(session_id)
+    for name, _, _ in _artifacts(path):
+        os.unlink(os.path.join(path, name))
+    pinned_file = os.path.join(path, PINNED_FILE)
+    if os.path.exists(pinned_file):
+        os.unlink(pinned_file)
+
+
+def gc_expired_sessions(ttl=SESSION_TTL_SECONDS):
+    """Removes workspaces whose session has not been seen for `ttl` seconds."""
+    if not os.path.isdir(SESSIONS_DIR):
+        return []
+    now = time.time()
+    removed = []
+    with os.scandir(SESSIONS_DIR) as it:
+        for entry in it:
+            if not entry.is_dir():
+                continue
+            heartbeat = os.path.join(entry.path, HEARTBEAT_FILE)
+            try:
+                last_seen = os.stat(heartbeat).st_mtime
+            except OSError:
+                last_seen = entry.stat().st_mtime
+            if now - last_seen > ttl:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed.append(entry.name)
+    return removed
+
+
+def gc_cache_dir(path, ttl=CACHE_TTL_SECONDS, max_bytes=CACHE_MAX_BYTES):
+    """
+    Trims a cache shared by all sessions (profiling reports, thumbnails):
+    files unused for `ttl` seconds, then least recently used ones until the
+    folder fits `max_bytes`. Whatever is removed is rebuilt on next use.
+    """
+    if not os.path.isdir(path):
+        return []
+    now = time.time()
+    files = sorted(_artifacts(path), key=lambda f: f[2])
+    total = sum(size for _, size, _ in files)
+    removed = []
+    for name, size, last_used in files:
+        if now - last_used <= ttl and total <= max_bytes:
+            break
+        try:
+            os.unlink(os.path.join(path, name))
+        except OSError:
+            continue
+        total -= size
+        removed.append(name)
+    return removed
+
+
+def start_gc(interval=WORKSPACE_GC_INTERVAL):
+    """Starts the background workspace GC once per process."""
+    global _gc_thread
+    with _gc_lock:
+        if _gc_thread is not None and _gc_thread.is_alive():
+            return _gc_thread
+
+        def _loop():
+            while True:
+                try:
+                    removed = gc_expired_sessions()
+                    if removed:
+                        print(f"🧹 Workspace GC removed {len(removed)} expired session(s)")
+                    for cache in (REPORTS_DIR, THUMBS_DIR):
+                        trimmed = gc_cache_dir(cache)
+                        if trimmed:
+                            print(f"🧹 Workspace GC trimmed {len(trimmed)} file(s) in {cache}")
+                except Exception as e:
+                    print(f"⚠️ Workspace GC error: {e}")
+                time.sleep(interval)
+
+        _gc_thread = threading.Thread(target=_loop, name="workspace-gc", daemon=True)
+        _gc_thread.start()
+        return _gc_thread